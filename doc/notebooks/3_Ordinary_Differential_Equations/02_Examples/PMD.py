@@ -2,63 +2,236 @@
 # POINT MASS DYNAMICS
 # Author: Ludovic Charleux, ludovic.charleux@univ-smb.fr, 01/2018 
 ################################################################################
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 from scipy import integrate, optimize
 from scipy.integrate import odeint
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix, csr_matrix, diags, identity, bmat
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 
-def distances(P):
+def minimum_image(D, box = None):
+    """
+    Returns the shortest periodic images of the displacements D in a box of
+    sides box (unchanged if box is None).
+    """
+    if box is None: return D
+    return D - box * np.round(D / box)
+
+def wrap(P, box):
+    """
+    Returns the positions folded back into the box [0, box).
+    """
+    W = np.mod(P, box)
+    return np.where(W >= box, W - box, W)
+
+def distances(P, box = None):
     """
     Return vectorials distance, scalar distance and normalized directions.
+    Leading dimensions of P (replicas) are kept. With a box, the minimum 
+    image convention is used.
     """
-    X, Y = P.T
-    dX = X - X[:, np.newaxis]
-    dY = Y - Y[:, np.newaxis]
-    D = np.array([dX, dY]).swapaxes(0,2)
-    R = np.sqrt(D[:,:,0]**2 + D[:,:,1]**2)
+    D = P[..., :, np.newaxis, :] - P[..., np.newaxis, :, :]
+    D = minimum_image(D, box)
+    R = np.sqrt(D[...,0]**2 + D[...,1]**2)
     U = np.divide(
             D, 
-            R[:,:,np.newaxis], 
+            R[...,np.newaxis], 
             out = np.zeros_like(D), 
-            where = R[:,:,np.newaxis] != 0.)
+            where = R[...,np.newaxis] != 0.)
     return D, R, U
 
+class Trajectory:
+    """
+    Circular buffer holding the last nk states. Every row is written twice, 
+    at i and i + nk, so that the history is always available in 
+    chronological order as a view, without any copy. With a path, the buffer
+    is a .npy memory map so long runs spill to disk.
+    """
+    def __init__(self, nk, width, path = None):
+        if path is None:
+            self.data = np.empty((2 * nk, width))
+        else:
+            self.data = np.lib.format.open_memmap(path, mode = "w+", 
+                                                  shape = (2 * nk, width))
+        self.data.fill(np.nan)
+        self.nk = nk
+        self.head = 0
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def append(self, Xs):
+        """
+        Appends states (rows of Xs), in O(len(Xs)).
+        """
+        nk = self.nk
+        Xs = np.atleast_2d(Xs)[-nk:]
+        if self.count:
+            # The last state may have been modified in place.
+            i = (self.head - 1) % nk
+            self.data[i] = self.data[i + nk] = self.last
+        rows = (self.head + np.arange(len(Xs))) % nk
+        self.data[rows] = Xs
+        self.data[rows + nk] = Xs
+        self.head = (self.head + len(Xs)) % nk
+        self.count = min(self.count + len(Xs), nk)
+    
+    def ordered(self):
+        """
+        Returns the history, oldest first, as a view.
+        """
+        end = self.head + self.nk
+        return self.data[end - self.count:end]
+    
+    @property
+    def last(self):
+        """
+        Returns a view of the last state.
+        """
+        return self.data[self.head + self.nk - 1]
+    
+
+_w1 = 1. / (2. - 2.**(1. / 3.))
+_w0 = 1. - 2. * _w1
+
+# Drift and kick coefficients of the position-first splitting integrators 
+# (velocity Verlet is handled apart to reuse the last force evaluation).
+SYMPLECTIC = {
+    "verlet": None,
+    "leapfrog": ([.5, .5], [1.]),
+    "yoshida4": ([_w1 / 2., (_w0 + _w1) / 2., (_w0 + _w1) / 2., _w1 / 2.], 
+                 [_w1, _w0, _w1]),
+    }
+
+IVP_METHODS = ("RK45", "RK23", "DOP853", "Radau", "BDF", "LSODA")
+# The solve_ivp methods that use a Jacobian.
+IMPLICIT_METHODS = ("Radau", "BDF", "LSODA")
+
 class PMD:
     """
     Point Mass Dynamics
     """
-    def __init__(self, m, P, V, nk = 10000):
-        n = len(P)
-        self._n = n
-        self.X = np.zeros([nk, 4 * n])
-        self.X.fill(np.NAN)
-        self.X[-1, :2 * n] = np.array(P).flatten()
-        self.X[-1, 2 * n:] = np.array(V).flatten()
+    def __init__(self, m, P, V, nk = 10000, path = None, forces = None, 
+                 box = None):
+        P = np.asarray(P, dtype = np.float64)
+        self.box = box if box is None else np.asarray(box, dtype = np.float64)
+        self.shape = P.shape
+        self._n = self.shape[-2]
+        self._size = P.size
+        self.trajectory = Trajectory(nk, 2 * P.size, path = path)
+        self.trajectory.append(np.concatenate([P.flatten(), 
+                                               np.array(V).flatten()]))
         self.m  = np.array(m)
         self.nk = nk
+        self._F = np.zeros(self.shape)
+        self._A = np.zeros(self.shape)
+        self._distances_key = None
+        self.forces = []
+        if forces is not None:
+            for force in forces: self.add_force(force)
+        self.observers = []
+        self.time = 0.
+    
+    def add_observer(self, observer):
+        """
+        Registers an Observer updated by every solve, returns it.
+        """
+        self.observers.append(observer)
+        return observer
+    
+    def add_force(self, force):
+        """
+        Registers a MetaForce instance, returns it.
+        """
+        force.set_master(self)
+        self.forces.append(force)
+        return force
+    
+    def distances(self, P):
+        """
+        Returns distances(P), computed once for given positions and shared by
+        all the forces.
+        """
+        if (self._distances_key is None or 
+            not np.array_equal(self._distances_key, P)):
+            self._distances = distances(P, self.box)
+            self._distances_key = P.copy()
+        return self._distances
+    
+    @property
+    def X(self):
+        """
+        Returns the recorded states, oldest first.
+        """
+        return self.trajectory.ordered()
       
-    def solve(self, dt, nt):
+    def solve(self, dt, nt, method = "odeint", observers = None, 
+              jacobian = True, **kwargs):
+        """
+        Integrates over a duration dt with nt outputs (and steps for the fixed
+        step methods). method is "odeint", "solve_ivp" (RK45), a solve_ivp 
+        method name such as "BDF" or "Radau" (extra keyword arguments are 
+        passed to the solver) or one of the SYMPLECTIC integrators. The 
+        registered observers, and the extra ones given, see every output 
+        state. If jacobian is True and all the forces provide an analytic 
+        Jacobian, it is passed to odeint (Dfun, dense) or to the implicit 
+        solve_ivp methods (jac, sparse except for LSODA). A failed solve_ivp
+        integration raises a RuntimeError and leaves the state unchanged.
+        """
         time = np.linspace(0., dt, nt + 1)
-        Xs = odeint( self.derivative, self.X[-1], time)
-        nk = self.nk
-        X = self.X
-        X[:nk - nt] = X[nt:]
-        X[-nt-1:] = Xs 
-        self.X    = X
+        if method == "solve_ivp": method = "RK45"
+        if (jacobian and method in ("odeint",) + IMPLICIT_METHODS and 
+            self.has_jacobian()):
+            if method == "odeint":
+                kwargs.setdefault("Dfun", 
+                                  lambda X, t: self.jacobian(X, t).toarray())
+            elif method == "LSODA":
+                kwargs.setdefault("jac", 
+                                  lambda t, X: self.jacobian(X, t).toarray())
+            else:
+                kwargs.setdefault("jac", lambda t, X: self.jacobian(X, t))
+        if method == "odeint":
+            Xs = odeint( self.derivative, self.trajectory.last, time, 
+                        **kwargs)
+        elif method in IVP_METHODS:
+            sol = integrate.solve_ivp(lambda t, X: self.derivative(X, t), 
+                                      (0., dt), self.trajectory.last, 
+                                      method = method, t_eval = time,
+                                      **kwargs)
+            if not sol.success: raise RuntimeError(sol.message)
+            Xs = sol.y.T
+        elif method in SYMPLECTIC:
+            Xs = self.integrate(dt / nt, nt, method)
+        else:
+            raise ValueError("Unknown method: {0}".format(method))
+        self.trajectory.append(Xs[1:])
+        k = self._size
+        for observer in self.observers + list(observers or []):
+            # An observer that has seen nothing yet starts at the initial state.
+            for i in range(0 if observer.calls == 0 else 1, nt + 1):
+                observer.observe(self, self.time + time[i], 
+                                 Xs[i, :k].reshape(self.shape), 
+                                 Xs[i, k:].reshape(self.shape))
+        self.time += dt
     
     def get_positions(self):
         """
         Returns the current positions.
         """
-        n = len(self.m)
-        return self.X[-1, :2 * n ].reshape(n ,2)
+        return self.trajectory.last[:self._size].reshape(self.shape)
     
     def set_positions(self, P):
         """
         Sets the current positions.
         """
-        n = len(self.m)
-        self.X[-1, :2 * n ] = P.flatten()
+        self.trajectory.last[:self._size] = P.flatten()
     
     positions = property(get_positions, set_positions) 
       
@@ -66,15 +239,112 @@ class PMD:
         """
         Returns the current velocities.
         """
-        n = len(self.m)
-        return  self.X[-1, 2 * n:].reshape(n ,2)
+        return  self.trajectory.last[self._size:].reshape(self.shape)
     
     velocities = property(get_velocities) 
+    
+    def derivative(self, X, t):
+        """
+        Returns the time derivative of the state X = [P, V].
+        """
+        P = X[:self._size].reshape(self.shape)
+        V = X[self._size:].reshape(self.shape)
+        return np.concatenate([V.flatten(), 
+                               self.acceleration(P, V, t).flatten()])
+    
+    def acceleration(self, P, V, t = 0.):
+        """
+        Returns the accelerations due to the registered forces, summed in a 
+        shared buffer. The returned buffer is overwritten by the next call. 
+        Subclasses that override derivative instead get the accelerations it
+        computes.
+        """
+        if type(self).derivative is not PMD.derivative:
+            X = np.concatenate([P.flatten(), V.flatten()])
+            return self.derivative(X, t)[self._size:].reshape(self.shape)
+        F = self._F
+        F.fill(0.)
+        for force in self.forces:
+            force.accumulate(P, V, F)
+        return np.divide(F, self.m.reshape(-1, 1), out = self._A)
+    
+    def potential(self, P):
+        """
+        Returns the potential energy of the registered forces.
+        """
+        return sum(force.potential(P) for force in self.forces)
+    
+    def has_jacobian(self):
+        """
+        Returns True if jacobian is available, without assembling it.
+        """
+        return (type(self).derivative is PMD.derivative and 
+                len(self.shape) == 2 and 
+                all(force.has_jacobian() for force in self.forces))
+    
+    def jacobian(self, X, t = 0.):
+        """
+        Returns the sparse Jacobian of derivative at X, assembled from the 
+        analytic Jacobians of the registered forces, or None if one of them 
+        has none (or derivative is overridden, or for an Ensemble).
+        """
+        if type(self).derivative is not PMD.derivative or len(self.shape) != 2:
+            return None
+        k = self._size
+        P = X[:k].reshape(self.shape)
+        V = X[k:].reshape(self.shape)
+        JP = csr_matrix((k, k))
+        JV = csr_matrix((k, k))
+        for force in self.forces:
+            J = force.jacobian(P, V)
+            if J is None: return None
+            JP = JP + J[0]
+            JV = JV + J[1]
+        Minv = diags(np.repeat(1. / np.broadcast_to(self.m, self._n), 2))
+        return bmat([[None, identity(k)], [Minv @ JP, Minv @ JV]], 
+                    format = "csr")
+    
+    def integrate(self, h, nt, method = "verlet"):
+        """
+        Fixed step symplectic integration of nt steps of size h from the 
+        current state, returns the flat states (nt + 1, 4n). The force evaluation 
+        budget is fixed: one per step for "verlet" and "leapfrog", three for
+        "yoshida4". Velocity dependent forces are evaluated with the latest
+        velocities, which breaks symplecticity but keeps the schemes usable.
+        """
+        k = self._size
+        Xs = np.empty((nt + 1, 2 * k))
+        Xs[0] = self.trajectory.last
+        P = Xs[0, :k].reshape(self.shape).copy()
+        V = Xs[0, k:].reshape(self.shape).copy()
+        t = 0.
+        if method == "verlet":
+            A = self.acceleration(P, V, t)
+            for i in range(1, nt + 1):
+                V += .5 * h * A
+                P += h * V
+                t += h
+                A = self.acceleration(P, V, t)
+                V += .5 * h * A
+                Xs[i, :k] = P.ravel()
+                Xs[i, k:] = V.ravel()
+        else:
+            drifts, kicks = SYMPLECTIC[method]
+            for i in range(1, nt + 1):
+                for c, d in zip(drifts, kicks):
+                    P += c * h * V
+                    t += c * h
+                    V += d * h * self.acceleration(P, V, t)
+                P += drifts[-1] * h * V
+                t += drifts[-1] * h
+                Xs[i, :k] = P.ravel()
+                Xs[i, k:] = V.ravel()
+        return Xs
      
     def xy(self):
-        n = self._n
-        p = self.X[-1,:2 * n].reshape(n, 2)
-        return p[:,0], p[:,1]
+        p = self.positions
+        if self.box is not None: p = wrap(p, self.box)
+        return p[...,0], p[...,1]
         
     def trail(self, i):
         n = self._n
@@ -82,6 +352,63 @@ class PMD:
         return X[:, 2*i], X[:, 2*i +1 ]
 
 
+class Ensemble(PMD):
+    """
+    E replicas of a system stacked in (E, n, 2) positions and velocities, so 
+    that every force evaluation is a single vectorized call. The forces must
+    accept the leading replica axis (PairForce, which then ignores its 
+    neighbor list, Gravity, Springs, Damping and Field do) and their 
+    parameters may be (E, 1, 1) arrays to vary them across the replicas. The
+    per edge parameters of Springs are (E, ne) arrays instead.
+    """
+    def __init__(self, m, P, V, nk = 1000, path = None, forces = None, 
+                 box = None):
+        P, V = np.broadcast_arrays(np.asarray(P, dtype = np.float64), 
+                                   np.asarray(V, dtype = np.float64))
+        super().__init__(m, P, V, nk = nk, path = path, forces = forces, 
+                         box = box)
+    
+    def __len__(self):
+        return self.shape[0]
+    
+    def states(self):
+        """
+        Returns the recorded positions and velocities, (nk, E, n, 2) each.
+        """
+        X = self.X
+        shape = (len(X),) + self.shape
+        return (X[:, :self._size].reshape(shape), 
+                X[:, self._size:].reshape(shape))
+
+def _ensemble_shard(args):
+    factory, index, P, V, dt, nt, method, kwargs = args
+    ensemble = factory(P, V, index)
+    ensemble.solve(dt, nt, method = method, **kwargs)
+    P, V = ensemble.states()
+    return P[-nt - 1:], V[-nt - 1:]
+
+def run_ensemble(factory, P, V, dt, nt, method = "verlet", processes = None, 
+                 shards = None, **kwargs):
+    """
+    Integrates E replicas sharded across a process pool. factory(P, V, index)
+    must be a picklable (module level) function returning an Ensemble for 
+    the replicas index, with positions P and velocities V. Returns the 
+    positions and velocities histories, (nt + 1, E, n, 2) each.
+    """
+    P, V = np.broadcast_arrays(np.asarray(P, dtype = np.float64), 
+                               np.asarray(V, dtype = np.float64))
+    if processes is None: processes = os.cpu_count() or 1
+    if shards is None: shards = processes
+    index = np.array_split(np.arange(len(P)), min(shards, len(P)))
+    tasks = [(factory, i, P[i], V[i], dt, nt, method, kwargs) for i in index]
+    if processes == 1:
+        results = list(map(_ensemble_shard, tasks))
+    else:
+        with ProcessPoolExecutor(processes) as executor:
+            results = list(executor.map(_ensemble_shard, tasks))
+    return (np.concatenate([r[0] for r in results], axis = 1), 
+            np.concatenate([r[1] for r in results], axis = 1))
+
 
 class MetaForce:
     """
@@ -98,3 +425,897 @@ class MetaForce:
                           V = self.master.velocities)
     def master_potential(self):
         return self.potential(P = self.master.positions)
+    
+    def accumulate(self, P, V, F):
+        """
+        Adds the force to F.
+        """
+        F += self.force(P, V)
+    
+    def potential(self, P):
+        return 0.
+    
+    def jacobian(self, P, V):
+        """
+        Returns the sparse (2n, 2n) derivatives of the force with respect to
+        the flattened positions and velocities, None if unavailable.
+        """
+        return None
+    
+    def has_jacobian(self):
+        """
+        Returns True if the force overrides jacobian.
+        """
+        return type(self).jacobian is not MetaForce.jacobian
+    
+    @property
+    def box(self):
+        """
+        Returns the periodic box of the master (None if unbounded).
+        """
+        return getattr(getattr(self, "master", None), "box", None)
+    
+    def distances(self, P):
+        """
+        Returns the distances, shared with the other forces of the master.
+        """
+        if getattr(self, "master", None) is None: return distances(P)
+        return self.master.distances(P)
+    
+    def scratch(self, P):
+        """
+        Returns a buffer shaped like P, reused by the kernels between calls.
+        """
+        scratch = getattr(self, "_scratch", None)
+        if scratch is None or scratch.shape != P.shape:
+            self._scratch = np.empty_like(P)
+        return self._scratch
+
+class Damping(MetaForce):
+    """
+    Linear viscous damping F = -c V.
+    """
+    def __init__(self, c = 1.):
+        self.c = c
+    
+    def force(self, P, V):
+        return -self.c * V
+    
+    def accumulate(self, P, V, F):
+        F -= self.c * V
+    
+    def jacobian(self, P, V):
+        return csr_matrix((P.size, P.size)), -self.c * identity(P.size, 
+                                                                format = "csr")
+
+class Field(MetaForce):
+    """
+    Uniform acceleration field g (weight).
+    """
+    def __init__(self, g = (0., -9.81)):
+        self.g = np.asarray(g, dtype = np.float64)
+    
+    def force(self, P, V = None):
+        return np.asarray(self.master.m).reshape(-1, 1) * self.g
+    
+    def potential(self, P):
+        return -(np.asarray(self.master.m) * (P @ self.g)).sum(axis = -1)
+    
+    def jacobian(self, P, V):
+        return csr_matrix((P.size, P.size)), csr_matrix((P.size, P.size))
+
+
+def scatter_pair_forces(I, J, F, n):
+    """
+    Sums pair forces into per particle forces: ``F[k]`` acts on ``J[k]`` and 
+    its opposite on ``I[k]``.
+    """
+    out = np.empty((n, F.shape[1]))
+    for c in range(F.shape[1]):
+        out[:, c] = (np.bincount(J, F[:, c], minlength = n) 
+                   - np.bincount(I, F[:, c], minlength = n))
+    return out
+
+class NeighborList:
+    """
+    Verlet neighbor list built with a k-d tree. Candidate pairs closer than 
+    ``cutoff + skin`` are kept until a particle has moved by more than half 
+    the skin, so the O(n log n) rebuild only happens every few steps and 
+    each force evaluation costs O(number of pairs). With a box, pairs are 
+    searched across the periodic boundaries.
+    """
+    def __init__(self, cutoff, skin = 0., box = None):
+        self.cutoff = cutoff
+        self.skin = skin
+        self.box = box
+        self.reference = None
+        self.candidates = None
+        self.builds = 0
+    
+    def build(self, P):
+        """
+        Rebuilds the candidate pairs.
+        """
+        if self.box is None:
+            tree = cKDTree(P)
+        else:
+            if 2. * (self.cutoff + self.skin) > np.min(self.box):
+                raise ValueError("cutoff + skin must not exceed half the box.")
+            tree = cKDTree(wrap(P, self.box), boxsize = self.box)
+        self.candidates = tree.query_pairs(self.cutoff + self.skin, 
+                                           output_type = "ndarray")
+        self.reference = P.copy()
+        self.builds += 1
+    
+    def update(self, P):
+        """
+        Rebuilds the candidate pairs only if needed.
+        """
+        if (self.reference is None or self.reference.shape != P.shape or 
+            ((P - self.reference)**2).sum(axis = 1).max() > (self.skin / 2.)**2):
+            self.build(P)
+    
+    def pairs(self, P):
+        """
+        Returns the sparse pair list of the pairs closer than the cutoff: 
+        indices I and J, vectorial distances D = P[I] - P[J], scalar 
+        distances R and normalized directions U.
+        """
+        self.update(P)
+        I, J = self.candidates.T
+        D = minimum_image(P[I] - P[J], self.box)
+        R = np.sqrt((D**2).sum(axis = 1))
+        keep = R < self.cutoff
+        I, J, D, R = I[keep], J[keep], D[keep], R[keep]
+        U = D / R[:, np.newaxis]
+        return I, J, D, R, U
+
+class PairForce(MetaForce):
+    """
+    Central pair force defined by pair_force(R) (attractive magnitude) and 
+    pair_potential(R). Pairs farther than cutoff are neglected. With a skin,
+    the pairs come from a neighbor list, otherwise from the dense distances
+    shared by the forces of the master.
+    """
+    def __init__(self, cutoff = np.inf, skin = None):
+        self.cutoff = cutoff
+        self.neighbors = None
+        if skin is not None: self.neighbors = NeighborList(cutoff, skin)
+    
+    def set_master(self, master):
+        MetaForce.set_master(self, master)
+        if self.neighbors is not None: self.neighbors.box = self.box
+    
+    def sparse(self, P):
+        """
+        Returns True if the pairs come from the neighbor list, which only 
+        handles single (n, 2) systems: replicas use the dense distances.
+        """
+        return self.neighbors is not None and P.ndim == 2
+    
+    def dense_pairs(self, P):
+        D, R, U = self.distances(P)
+        keep = (R != 0.) & (R < self.cutoff)
+        return keep, np.where(keep, R, 1.), U
+    
+    def accumulate(self, P, V, F):
+        """
+        Adds the force to F. A single unbounded system without neighbor list
+        uses the compiled kernel of the subclass, if it defines kernel(P, F).
+        """
+        if (P.ndim == 2 and self.box is None and not self.sparse(P) and 
+            hasattr(self, "kernel")):
+            F += self.kernel(P, self.scratch(P))
+        else:
+            F += self.force(P, V)
+    
+    def force(self, P, V = None):
+        if self.sparse(P):
+            I, J, D, R, U = self.neighbors.pairs(P)
+            return scatter_pair_forces(I, J, 
+                                       self.pair_force(R)[:, np.newaxis] * U, 
+                                       len(P))
+        keep, R, U = self.dense_pairs(P)
+        f = np.where(keep, self.pair_force(R), 0.)
+        return (f[..., np.newaxis] * U).sum(axis = -3)
+    
+    def potential(self, P):
+        if self.sparse(P):
+            I, J, D, R, U = self.neighbors.pairs(P)
+            return self.pair_potential(R).sum()
+        keep, R, U = self.dense_pairs(P)
+        return np.where(keep, self.pair_potential(R), 0.).sum(
+                        axis = (-2, -1)) / 2.
+    
+    def has_jacobian(self):
+        return hasattr(self, "pair_stiffness")
+    
+    def jacobian(self, P, V):
+        """
+        Analytic Jacobian, available if the subclass defines pair_stiffness(R),
+        the derivative of pair_force.
+        """
+        if not self.has_jacobian(): return None
+        if self.sparse(P):
+            I, J, D, R, U = self.neighbors.pairs(P)
+        else:
+            keep, R, U = self.dense_pairs(P)
+            I, J = np.nonzero(np.triu(keep))
+            R, U = R[I, J], U[I, J]
+        JP = central_jacobian(I, J, self.pair_force(R), self.pair_stiffness(R), 
+                              U, R, len(P))
+        return JP, csr_matrix((P.size, P.size))
+
+class Morse(PairForce):
+    """
+    Morse pair force, by default evaluated over a neighbor list. The cutoff
+    and the skin are given in units of the range 1 / a: interactions beyond 
+    re + cutoff / a are neglected and the potential is shifted to vanish 
+    there, so that the energy stays continuous.
+    """
+    def __init__(self, De = 1., a = 1., re = 1., cutoff = 5., skin = .5):
+        self.De = De
+        self.a  = a
+        self.re = re
+        self.shift = 0.
+        super().__init__(re + cutoff / a, None if skin is None else skin / a)
+        self.shift = self.pair_potential(self.cutoff)
+        
+    def pair_force(self, R):
+        """
+        Returns the attractive force magnitude at distance R.
+        """
+        De, a, re = self.De, self.a, self.re
+        E = np.exp(-a * (R - re))
+        return 2. * De * a * (1. - E) * E
+    
+    def pair_stiffness(self, R):
+        De, a, re = self.De, self.a, self.re
+        E = np.exp(-a * (R - re))
+        return 2. * De * a**2 * E * (2. * E - 1.)
+    
+    def pair_potential(self, R):
+        """
+        Returns De ((1 - E)**2 - 1) with E = exp(-a (R - re)), minus its value
+        at the cutoff.
+        """
+        De, a, re = self.De, self.a, self.re
+        E = np.exp(-a * (R - re))
+        return De * (E**2 - 2. * E) - self.shift
+    
+    def kernel(self, P, F):
+        return morse_forces(P, self.De, self.a, self.re, self.cutoff, F)
+
+class LennardJones(PairForce):
+    """
+    Lennard-Jones pair force.
+    """
+    def __init__(self, epsilon = 1., sigma = 1., cutoff = np.inf, 
+                 skin = None):
+        self.epsilon = epsilon
+        self.sigma = sigma
+        super().__init__(cutoff, skin)
+    
+    def pair_force(self, R):
+        S6 = (self.sigma / R)**6
+        return -24. * self.epsilon * (2. * S6**2 - S6) / R
+    
+    def pair_stiffness(self, R):
+        S6 = (self.sigma / R)**6
+        return 24. * self.epsilon * (26. * S6**2 - 7. * S6) / R**2
+    
+    def pair_potential(self, R):
+        S6 = (self.sigma / R)**6
+        return 4. * self.epsilon * (S6**2 - S6)
+    
+    def kernel(self, P, F):
+        return lennard_jones_forces(P, self.epsilon, self.sigma, self.cutoff, 
+                                    F)
+
+class Gravity(MetaForce):
+    """
+    Newtonian gravity, distances are clamped to cutoff_radius.
+    """
+    def __init__(self, G = 6.67e-11, cutoff_radius = 1.e-2):
+        self.G = G
+        self.cutoff_radius = cutoff_radius
+    
+    def masses(self):
+        """
+        Returns the (n,) masses of the master, which may be given as a scalar.
+        """
+        return np.broadcast_to(self.master.m, self.master._n)
+    
+    def accumulate(self, P, V, F):
+        """
+        Adds the force to F, with the compiled kernel for a single unbounded
+        system.
+        """
+        if P.ndim == 2 and self.box is None:
+            F += gravity_forces(P, self.masses(), self.G, self.cutoff_radius, 
+                                self.scratch(P))
+        else:
+            F += self.force(P, V)
+    
+    def force(self, P, V = None):
+        m = self.masses()
+        D, R, U = self.distances(P)
+        R = np.where(R > self.cutoff_radius, R, self.cutoff_radius)
+        R[..., np.eye(len(m), dtype = bool)] = np.inf
+        return ((self.G * m * m[:, np.newaxis] * R**-2)[..., np.newaxis] 
+                * U).sum(axis = -3)
+    
+    def potential(self, P):
+        m, rc = self.masses(), self.cutoff_radius
+        D, R, U = self.distances(P)
+        R = R.copy()
+        R[..., np.eye(len(m), dtype = bool)] = np.inf
+        # Linear inside cutoff_radius, where the force is constant.
+        u = np.where(R > rc, -1. / R, (R - 2. * rc) / rc**2)
+        return (self.G * m * m[:, np.newaxis] * u).sum(axis = (-2, -1)) / 2.
+    
+    def jacobian(self, P, V):
+        m, rc = self.masses(), self.cutoff_radius
+        D, R, U = self.distances(P)
+        I, J = np.triu_indices(len(m), 1)
+        R, U = R[I, J], U[I, J]
+        GM = self.G * m[I] * m[J]
+        Rc = np.maximum(R, rc)
+        JP = central_jacobian(I, J, GM / Rc**2, 
+                              np.where(R > rc, -2. * GM / Rc**3, 0.), U, R, 
+                              len(m))
+        return JP, csr_matrix((P.size, P.size))
+
+class Springs(MetaForce):
+    """
+    Bonded springs and dampers along the edges conn (ne, 2). The tension of
+    an edge is k (R - L0) + c dR/dt. Only the edges are visited, so the cost
+    grows with their number. The rest lengths L0 default to the initial
+    edge lengths of the master. The parameters are (ne,) arrays, or (E, ne)
+    arrays for an Ensemble of E replicas.
+    """
+    def __init__(self, conn, k = 1., L0 = None, c = 0.):
+        self.conn = np.asarray(conn, dtype = np.int64).reshape(-1, 2)
+        ne = len(self.conn)
+        self.k = self.per_edge(k, ne)
+        self.c = self.per_edge(c, ne)
+        self.L0 = L0 if L0 is None else self.per_edge(L0, ne)
+    
+    @staticmethod
+    def per_edge(x, ne):
+        """
+        Broadcasts a parameter to (ne,), or to (E, ne) if it varies across 
+        replicas.
+        """
+        x = np.asarray(x, dtype = np.float64)
+        return np.broadcast_to(x, np.broadcast_shapes(x.shape, (ne,)))
+    
+    @classmethod
+    def from_truss(cls, model, c = 0.):
+        """
+        Returns the springs of the bars of a plane truss.Model: stiffnesses 
+        E S / L0 and rest lengths L0 taken from its initial geometry.
+        """
+        if model.dim != 2:
+            raise ValueError("PMD only handles plane trusses.")
+        return cls(model.connectivity(), k = model.stiffnesses(), 
+                   L0 = model.lengths(), c = c)
+    
+    def set_master(self, master):
+        MetaForce.set_master(self, master)
+        if self.L0 is None:
+            self.L0 = self.geometry(master.positions)[2]
+    
+    def geometry(self, P):
+        """
+        Returns the edge vectors D = P[J] - P[I], their directions U and 
+        lengths R.
+        """
+        I, J = self.conn.T
+        D = minimum_image(P[..., J, :] - P[..., I, :], self.box)
+        R = np.sqrt((D**2).sum(axis = -1))
+        return D, D / R[..., np.newaxis], R
+    
+    def tensions(self, P, V = None):
+        D, U, R = self.geometry(P)
+        T = self.k * (R - self.L0)
+        if V is not None and self.c.any():
+            I, J = self.conn.T
+            T = T + self.c * (U * (V[..., J, :] - V[..., I, :])).sum(axis = -1)
+        return T, U
+    
+    def force(self, P, V = None):
+        I, J = self.conn.T
+        T, U = self.tensions(P, V)
+        TU = T[..., np.newaxis] * U
+        if P.ndim == 2:
+            return scatter_pair_forces(J, I, TU, len(P))
+        F = np.zeros_like(P)
+        np.add.at(F, (Ellipsis, I, slice(None)), TU)
+        np.add.at(F, (Ellipsis, J, slice(None)), -TU)
+        return F
+    
+    def potential(self, P):
+        D, U, R = self.geometry(P)
+        return (.5 * self.k * (R - self.L0)**2).sum(axis = -1)
+    
+    def jacobian(self, P, V = None):
+        """
+        Returns the sparse (2n, 2n) derivatives of the forces with respect to
+        the flattened positions and velocities.
+        """
+        I, J = self.conn.T
+        D, U, R = self.geometry(P)
+        T, U = self.tensions(P, V)
+        UU = U[:, :, np.newaxis] * U[:, np.newaxis, :]
+        N = (np.eye(2) - UU) / R[:, np.newaxis, np.newaxis]
+        GP = (self.k[:, np.newaxis, np.newaxis] * UU 
+              + T[:, np.newaxis, np.newaxis] * N)
+        if V is not None and self.c.any():
+            W = V[J] - V[I]
+            NW = np.einsum("eij,ej->ei", N, W)
+            GP += (self.c[:, np.newaxis, np.newaxis] * U[:, :, np.newaxis] 
+                   * NW[:, np.newaxis, :])
+        GV = self.c[:, np.newaxis, np.newaxis] * UU
+        n = len(P)
+        return edge_jacobian(I, J, GP, n), edge_jacobian(I, J, GV, n)
+
+def edge_jacobian(I, J, G, n):
+    """
+    Assembles the (2n, 2n) sparse Jacobian of edge forces f_I = -f_J whose
+    derivative with respect to P[J] - P[I] is G (ne, 2, 2).
+    """
+    r, c = np.meshgrid(np.arange(2), np.arange(2), indexing = "ij")
+    rows, cols, vals = [], [], []
+    for a, b, sign in ((I, J, 1.), (I, I, -1.), (J, I, 1.), (J, J, -1.)):
+        rows.append(2 * a[:, np.newaxis, np.newaxis] + r)
+        cols.append(2 * b[:, np.newaxis, np.newaxis] + c)
+        vals.append(sign * G)
+    rows, cols, vals = [np.concatenate(x).ravel() for x in (rows, cols, vals)]
+    return coo_matrix((vals, (rows, cols)), shape = (2 * n, 2 * n)).tocsr()
+
+def central_jacobian(I, J, f, df, U, R, n):
+    """
+    Assembles the (2n, 2n) sparse Jacobian of central pair forces of 
+    attractive magnitudes f(R), with derivatives df(R), along the directions 
+    U (either sign).
+    """
+    UU = U[:, :, np.newaxis] * U[:, np.newaxis, :]
+    G = (df[:, np.newaxis, np.newaxis] * UU 
+         + (f / R)[:, np.newaxis, np.newaxis] * (np.eye(2) - UU))
+    return edge_jacobian(I, J, G, n)
+
+def ragged_range(starts, counts):
+    """
+    Returns the concatenation of ``arange(s, s + c)`` for all the starts s and 
+    counts c.
+    """
+    total = counts.sum()
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+class QuadTree:
+    """
+    Linear quadtree: the bodies are sorted along a Morton (Z-order) curve so 
+    that every cell of every level holds a contiguous slice of them. Cells 
+    holding at most ``leaf_size`` bodies, or lying at the ``depth`` level, are
+    leaves. All the cells are stored in flat arrays.
+    """
+    def __init__(self, P, m, depth = 16, leaf_size = 1):
+        P = np.asarray(P, dtype = np.float64)
+        m = np.broadcast_to(np.asarray(m, dtype = np.float64), len(P))
+        lo = P.min(axis = 0)
+        size = (P.max(axis = 0) - lo).max() * (1. + 1.e-9) 
+        if size == 0.: size = 1.
+        Q = ((P - lo) / size * 2**depth).astype(np.uint64)
+        Q = np.minimum(Q, np.uint64(2**depth - 1))
+        code = np.zeros(len(P), dtype = np.uint64)
+        for b in range(depth):
+            b = np.uint64(b)
+            one = np.uint64(1)
+            code |= ((Q[:, 0] >> b) & one) << (np.uint64(2) * b)
+            code |= ((Q[:, 1] >> b) & one) << (np.uint64(2) * b + one)
+        self.order = np.argsort(code, kind = "stable")
+        code = code[self.order]
+        Ps, ms = P[self.order], m[self.order]
+        levels = []
+        for l in range(depth + 1):
+            key = code >> np.uint64(2 * (depth - l))
+            start = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+            count = np.diff(np.r_[start, len(code)])
+            mass = np.add.reduceat(ms, start)
+            com = np.add.reduceat(ms[:, np.newaxis] * Ps, start) 
+            com /= np.where(mass == 0., 1., mass)[:, np.newaxis]
+            levels.append((key[start], start, count, mass, com,
+                           np.full(len(start), size / 2**l)))
+            if count.max() <= leaf_size: break
+        offsets = np.cumsum([0] + [len(lv[0]) for lv in levels])
+        child_start, child_end = [], []
+        for l, lv in enumerate(levels):
+            if l + 1 < len(levels):
+                parents = levels[l + 1][0] >> np.uint64(2)
+                child_start.append(offsets[l + 1] + 
+                                   np.searchsorted(parents, lv[0], "left"))
+                child_end.append(offsets[l + 1] + 
+                                 np.searchsorted(parents, lv[0], "right"))
+            else:
+                child_start.append(np.zeros(len(lv[0]), dtype = np.int64))
+                child_end.append(np.zeros(len(lv[0]), dtype = np.int64))
+        cat = lambda i: np.concatenate([lv[i] for lv in levels])
+        self.start, self.count = cat(1), cat(2)
+        self.mass, self.com, self.width = cat(3), cat(4), cat(5)
+        self.child_start = np.concatenate(child_start)
+        self.child_end = np.concatenate(child_end)
+        self.leaf = (self.count <= leaf_size) | (self.child_end == 0)
+
+def tree_gravity(P, m, G = 1., theta = .5, softening = 0., depth = 16,
+                 leaf_size = 1):
+    """
+    Barnes-Hut gravity: returns the accelerations and the specific potential
+    energies of the bodies. Cells seen under an angle smaller than theta are
+    replaced by their center of mass, theta = 0 gives the direct sum.
+    """
+    P = np.asarray(P, dtype = np.float64)
+    n = len(P)
+    tree = QuadTree(P, m, depth = depth, leaf_size = leaf_size)
+    A = np.zeros((n, 2))
+    phi = np.zeros(n)
+    eps2 = softening**2
+    def add(bodies, d, r2, mass):
+        w = G * mass * (r2 + eps2)**-1.5
+        for c in range(2):
+            A[:, c] += np.bincount(bodies, w * d[:, c], minlength = n)
+        phi[:] -= np.bincount(bodies, G * mass * (r2 + eps2)**-.5, minlength = n)
+    bodies = np.arange(n)
+    cells = np.zeros(n, dtype = np.int64)
+    while len(bodies):
+        d = tree.com[cells] - P[bodies]
+        r2 = (d**2).sum(axis = 1)
+        far = tree.width[cells]**2 < theta**2 * r2
+        add(bodies[far], d[far], r2[far], tree.mass[cells[far]])
+        direct = ~far & tree.leaf[cells]
+        if direct.any():
+            b, c = bodies[direct], cells[direct]
+            counts = tree.count[c]
+            b = np.repeat(b, counts)
+            j = tree.order[ragged_range(tree.start[c], counts)]
+            keep = j != b
+            b, j = b[keep], j[keep]
+            dj = P[j] - P[b]
+            add(b, dj, (dj**2).sum(axis = 1), np.broadcast_to(m, n)[j])
+        opened = ~far & ~tree.leaf[cells]
+        c = cells[opened]
+        counts = tree.child_end[c] - tree.child_start[c]
+        bodies = np.repeat(bodies[opened], counts)
+        cells = ragged_range(tree.child_start[c], counts)
+    return A, phi
+
+class BarnesHut(MetaForce):
+    """
+    Tree code gravity force provider, O(n log n) per evaluation. The masses 
+    are taken from the master PMD instance unless ``m`` is given.
+    """
+    def __init__(self, G = 1., theta = .5, softening = 0., m = None, 
+                 leaf_size = 1):
+        self.G = G
+        self.theta = theta
+        self.softening = softening
+        self.m = m
+        self.leaf_size = leaf_size
+    
+    def masses(self):
+        return self.master.m if self.m is None else np.asarray(self.m)
+        
+    def force(self, P, V = None):
+        m = self.masses()
+        A, phi = tree_gravity(P, m, G = self.G, theta = self.theta, 
+                              softening = self.softening, 
+                              leaf_size = self.leaf_size)
+        return np.broadcast_to(m, len(P))[:, np.newaxis] * A
+    
+    def potential(self, P):
+        m = self.masses()
+        A, phi = tree_gravity(P, m, G = self.G, theta = self.theta, 
+                              softening = self.softening, 
+                              leaf_size = self.leaf_size)
+        return .5 * (np.broadcast_to(m, len(P)) * phi).sum()
+
+
+################################################################################
+# PAIRWISE FORCE KERNELS
+# Every kernel writes the forces into F (n, 2) and returns it. The loop 
+# versions are compiled with numba when it is installed and then allocate 
+# nothing, the NumPy versions are the fallback.
+################################################################################
+
+def _morse_loop(P, De, a, re, cutoff, F):
+    F[:] = 0.
+    n = len(P)
+    for i in range(n):
+        for j in range(i + 1, n):
+            dx, dy = P[i, 0] - P[j, 0], P[i, 1] - P[j, 1]
+            r = np.sqrt(dx * dx + dy * dy)
+            if r == 0. or r >= cutoff: continue
+            e = np.exp(-a * (r - re))
+            f = 2. * De * a * (1. - e) * e / r
+            F[j, 0] += f * dx
+            F[j, 1] += f * dy
+            F[i, 0] -= f * dx
+            F[i, 1] -= f * dy
+    return F
+
+def _morse_numpy(P, De, a, re, cutoff, F):
+    D, R, U = distances(P)
+    E = np.exp(-a * (R - re))
+    f = np.where((R != 0.) & (R < cutoff), 2. * De * a * (1. - E) * E, 0.)
+    F[:] = (f[:, :, np.newaxis] * U).sum(axis = 0)
+    return F
+
+def _gravity_loop(P, m, G, cutoff_radius, F):
+    F[:] = 0.
+    n = len(P)
+    for i in range(n):
+        for j in range(i + 1, n):
+            dx, dy = P[i, 0] - P[j, 0], P[i, 1] - P[j, 1]
+            r = np.sqrt(dx * dx + dy * dy)
+            if r == 0.: continue
+            rc = max(r, cutoff_radius)
+            f = G * m[i] * m[j] / (rc * rc * r)
+            F[j, 0] += f * dx
+            F[j, 1] += f * dy
+            F[i, 0] -= f * dx
+            F[i, 1] -= f * dy
+    return F
+
+def _gravity_numpy(P, m, G, cutoff_radius, F):
+    D, R, U = distances(P)
+    np.fill_diagonal(R, np.inf)
+    R = np.maximum(R, cutoff_radius)
+    F[:] = ((G * m * m[:, np.newaxis] * R**-2)[:, :, np.newaxis] * U).sum(axis = 0)
+    return F
+
+def _lennard_jones_loop(P, epsilon, sigma, cutoff, F):
+    F[:] = 0.
+    n = len(P)
+    for i in range(n):
+        for j in range(i + 1, n):
+            dx, dy = P[i, 0] - P[j, 0], P[i, 1] - P[j, 1]
+            r2 = dx * dx + dy * dy
+            if r2 == 0. or r2 >= cutoff * cutoff: continue
+            s6 = (sigma * sigma / r2)**3
+            f = -24. * epsilon * (2. * s6 * s6 - s6) / r2
+            F[j, 0] += f * dx
+            F[j, 1] += f * dy
+            F[i, 0] -= f * dx
+            F[i, 1] -= f * dy
+    return F
+
+def _lennard_jones_numpy(P, epsilon, sigma, cutoff, F):
+    D, R, U = distances(P)
+    keep = (R != 0.) & (R < cutoff)
+    S6 = np.where(keep, sigma / np.where(keep, R, 1.), 0.)**6
+    f = -24. * epsilon * (2. * S6**2 - S6) / np.where(keep, R, 1.)
+    F[:] = (f[:, :, np.newaxis] * U).sum(axis = 0)
+    return F
+
+def _spring_loop(P, conn, k, L0, F):
+    F[:] = 0.
+    for e in range(len(conn)):
+        i, j = conn[e, 0], conn[e, 1]
+        dx, dy = P[j, 0] - P[i, 0], P[j, 1] - P[i, 1]
+        r = np.sqrt(dx * dx + dy * dy)
+        f = k[e] * (r - L0[e]) / r
+        F[i, 0] += f * dx
+        F[i, 1] += f * dy
+        F[j, 0] -= f * dx
+        F[j, 1] -= f * dy
+    return F
+
+def _spring_numpy(P, conn, k, L0, F):
+    I, J = conn.T
+    D = P[J] - P[I]
+    R = np.sqrt((D**2).sum(axis = 1))
+    F[:] = scatter_pair_forces(J, I, ((k * (R - L0)) / R)[:, np.newaxis] * D, 
+                               len(P))
+    return F
+
+NUMPY_KERNELS = {"morse": _morse_numpy, "gravity": _gravity_numpy, 
+                 "lennard_jones": _lennard_jones_numpy, 
+                 "springs": _spring_numpy}
+LOOP_KERNELS = {"morse": _morse_loop, "gravity": _gravity_loop, 
+                "lennard_jones": _lennard_jones_loop, "springs": _spring_loop}
+if njit is None:
+    KERNELS = NUMPY_KERNELS
+else:
+    KERNELS = {k: njit(v) for k, v in LOOP_KERNELS.items()}
+
+def morse_forces(P, De = 1., a = 1., re = 1., cutoff = np.inf, F = None):
+    """
+    Morse pair forces, pairs farther than cutoff are neglected.
+    """
+    if F is None: F = np.empty_like(P)
+    return KERNELS["morse"](P, De, a, re, cutoff, F)
+
+def gravity_forces(P, m, G = 6.67e-11, cutoff_radius = 1.e-2, F = None):
+    """
+    Newtonian gravity forces, distances are clamped to cutoff_radius.
+    """
+    if F is None: F = np.empty_like(P)
+    return KERNELS["gravity"](P, np.asarray(m, dtype = np.float64), G, 
+                              cutoff_radius, F)
+
+def lennard_jones_forces(P, epsilon = 1., sigma = 1., cutoff = np.inf, 
+                         F = None):
+    """
+    Lennard-Jones pair forces, pairs farther than cutoff are neglected.
+    """
+    if F is None: F = np.empty_like(P)
+    return KERNELS["lennard_jones"](P, epsilon, sigma, cutoff, F)
+
+def spring_forces(P, conn, k, L0, F = None):
+    """
+    Linear spring forces, conn (ne, 2) holds the node indices of the springs.
+    """
+    if F is None: F = np.empty_like(P)
+    ne = len(conn)
+    return KERNELS["springs"](P, np.asarray(conn, dtype = np.int64), 
+                              np.broadcast_to(np.asarray(k, dtype = np.float64), ne).copy(),
+                              np.broadcast_to(np.asarray(L0, dtype = np.float64), ne).copy(),
+                              F)
+
+
+################################################################################
+# OBSERVERS
+# Reductions computed on the fly by PMD.solve, so that long runs do not need 
+# to keep their trajectory. With an Ensemble, the reductions are computed per
+# replica.
+################################################################################
+
+class RunningStats:
+    """
+    Running mean and variance (Welford's algorithm) of scalars or arrays.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self._M2 = 0.
+    
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.count
+        self._M2 = self._M2 + delta * (x - self.mean)
+    
+    @property
+    def variance(self):
+        return self._M2 / max(self.count - 1, 1)
+    
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+class Observer:
+    """
+    Base observer: update(pmd, t, P, V) is called every ``every`` states.
+    """
+    def __init__(self, every = 1):
+        self.every = every
+        self.calls = 0
+    
+    def observe(self, pmd, t, P, V):
+        if self.calls % self.every == 0: self.update(pmd, t, P, V)
+        self.calls += 1
+    
+    def update(self, pmd, t, P, V):
+        raise NotImplementedError
+
+class EnergyObserver(Observer):
+    """
+    Kinetic, potential and total energies, temperature (kB = 1, 2 degrees of
+    freedom per mass) and the largest drift of the total energy.
+    """
+    def __init__(self, every = 1):
+        super().__init__(every)
+        self.kinetic = RunningStats()
+        self.potential = RunningStats()
+        self.total = RunningStats()
+        self.temperature = RunningStats()
+        self.initial = None
+        self.drift = 0.
+        self.last = None
+    
+    def update(self, pmd, t, P, V):
+        m = np.broadcast_to(pmd.m, pmd._n)
+        K = .5 * (m * (V**2).sum(axis = -1)).sum(axis = -1)
+        U = pmd.potential(P)
+        E = K + U
+        if self.initial is None: self.initial = E
+        self.drift = np.maximum(self.drift, np.abs(E - self.initial))
+        self.kinetic.update(K)
+        self.potential.update(U)
+        self.total.update(E)
+        self.temperature.update(K / pmd._n)
+        self.last = t, K, U, E
+
+class MomentumObserver(Observer):
+    """
+    Linear momentum and angular momentum about the origin.
+    """
+    def __init__(self, every = 1):
+        super().__init__(every)
+        self.momentum = RunningStats()
+        self.angular = RunningStats()
+        self.last = None
+    
+    def update(self, pmd, t, P, V):
+        mV = np.broadcast_to(pmd.m, pmd._n)[:, np.newaxis] * V
+        p = mV.sum(axis = -2)
+        L = (P[..., 0] * mV[..., 1] - P[..., 1] * mV[..., 0]).sum(axis = -1)
+        self.momentum.update(p)
+        self.angular.update(L)
+        self.last = t, p, L
+
+class RDFObserver(Observer):
+    """
+    Radial distribution function g(r) histogram up to r_max. The density 
+    uses the periodic box of the PMD, or area for unbounded systems. With a 
+    box, r_max must not exceed half its smallest side, beyond which the 
+    minimum image misses pairs.
+    """
+    def __init__(self, r_max, bins = 100, area = None, every = 1):
+        super().__init__(every)
+        self.edges = np.linspace(0., r_max, bins + 1)
+        self.counts = np.zeros(bins)
+        self.area = area
+        self.frames = 0
+        self.n = 0
+    
+    def update(self, pmd, t, P, V):
+        r_max = self.edges[-1]
+        if self.area is None:
+            if pmd.box is None:
+                raise ValueError("RDFObserver needs an area for unbounded systems.")
+            self.area = np.prod(pmd.box)
+        if pmd.box is not None and 2. * r_max > np.min(pmd.box):
+            raise ValueError("r_max must not exceed half the box.")
+        for Pe in P.reshape(-1, pmd._n, 2):
+            if pmd.box is None:
+                tree = cKDTree(Pe)
+            else:
+                tree = cKDTree(wrap(Pe, pmd.box), boxsize = pmd.box)
+            I, J = tree.query_pairs(r_max, output_type = "ndarray").T
+            R = np.sqrt((minimum_image(Pe[I] - Pe[J], pmd.box)**2).sum(axis = 1))
+            self.counts += np.histogram(R, self.edges)[0]
+            self.frames += 1
+        self.n = pmd._n
+    
+    def result(self):
+        """
+        Returns the bin centers and g(r).
+        """
+        r = .5 * (self.edges[1:] + self.edges[:-1])
+        shells = np.pi * (self.edges[1:]**2 - self.edges[:-1]**2)
+        ideal = self.frames * .5 * self.n * (self.n - 1) / self.area * shells
+        return r, self.counts / ideal
+
+class MSDObserver(Observer):
+    """
+    Mean square displacement from the first observed positions. Only one
+    scalar (per replica) is kept per observed state.
+    """
+    def __init__(self, every = 1):
+        super().__init__(every)
+        self.reference = None
+        self.times = []
+        self.values = []
+    
+    def update(self, pmd, t, P, V):
+        if self.reference is None: self.reference = P.copy()
+        self.times.append(t)
+        self.values.append(((P - self.reference)**2).sum(axis = -1).mean(axis = -1))
+    
+    def result(self):
+        """
+        Returns the times and the mean square displacements.
+        """
+        return np.array(self.times), np.array(self.values)
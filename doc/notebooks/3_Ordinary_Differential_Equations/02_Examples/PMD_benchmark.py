@@ -0,0 +1,89 @@
+"""
+Benchmark of the PMD pairwise force kernels.
+
+Times the NumPy and the compiled (numba) versions of every kernel on random
+particle sets of growing size, records the peak memory of one call and
+prints the speedups:
+
+  python PMD_benchmark.py --sizes 100 1000 3000 --output PMD_benchmark.json
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+import numpy as np
+import PMD
+
+SIZES = (100, 300, 1000, 3000)
+
+def arguments(kernel, n, seed = 0):
+    """
+    Returns the arguments of a kernel on n random particles.
+    """
+    rng = np.random.RandomState(seed)
+    P = rng.rand(n, 2) * n**.5
+    F = np.empty_like(P)
+    if kernel == "morse":
+        return P, 1., 2., 1., 3., F
+    if kernel == "gravity":
+        return P, rng.rand(n), 1., 1.e-2, F
+    if kernel == "lennard_jones":
+        return P, 1., 1., 2.5, F
+    if kernel == "springs":
+        conn = np.array([np.arange(n - 1), np.arange(1, n)]).T
+        return P, conn, np.ones(n - 1), np.ones(n - 1), F
+
+def measure(func, args, repeat = 3):
+    """
+    Returns the best time of ``repeat`` calls and the peak memory of one call.
+    """
+    func(*args)
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+def run(sizes = SIZES, repeat = 3, verbose = True):
+    """
+    Runs the benchmark and returns the results as a JSON serializable dict.
+    """
+    results = []
+    for kernel in PMD.NUMPY_KERNELS:
+        for n in sizes:
+            args = arguments(kernel, n)
+            t_numpy, m_numpy = measure(PMD.NUMPY_KERNELS[kernel], args, repeat)
+            t_kernel, m_kernel = measure(PMD.KERNELS[kernel], args, repeat)
+            results.append({"kernel": kernel, "n": n,
+                            "numpy_time": t_numpy, "numpy_memory": m_numpy,
+                            "time": t_kernel, "memory": m_kernel,
+                            "speedup": t_numpy / t_kernel})
+            if verbose:
+                print("{kernel:>14} {n:>6}: numpy {numpy_time:.3e} s "
+                      "{numpy_memory:>10} B, kernel {time:.3e} s {memory:>8} B,"
+                      " speedup x{speedup:.1f}".format(**results[-1]))
+    meta = {"python": platform.python_version(), "numpy": np.__version__,
+            "numba": PMD.njit is not None, "machine": platform.machine(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--output", default = None,
+                        help = "file where the results are written")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES,
+                        help = "numbers of particles")
+    parser.add_argument("--repeat", type = int, default = 3)
+    args = parser.parse_args()
+    if PMD.njit is None:
+        print("numba is not installed: both columns use the NumPy kernels.")
+    results = run(args.sizes, repeat = args.repeat)
+    if args.output != None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent = 1)
@@ -1,15 +1,423 @@
+import copy
+import hashlib
+import inspect
+import json
+import os
+from collections.abc import MutableSequence
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import numba
 from matplotlib import patches, cm, pyplot
+from matplotlib.collections import LineCollection, PolyCollection, EllipseCollection
+from scipy.sparse import coo_matrix, diags
+from scipy.sparse.linalg import splu, spilu, cg, LinearOperator, eigsh
+from scipy.linalg import cho_factor, cho_solve, eigh
+from scipy.optimize import NonlinearConstraint
+
+def bar_dofs(conn, dim = 2):
+  """
+  Returns the global degrees of freedom of each bar.
+  
+  :param conn: node indices of each bar.
+  :type conn: (nb, 2) int array
+  :param dim: number of space dimensions.
+  :type dim: int
+  :rtype: (nb, 2 * dim) int array
+  """
+  return (dim * conn[:, :, np.newaxis] + np.arange(dim)).reshape(len(conn), 2 * dim)
+
+def assemble_bar_matrices(conn, Ke, nn):
+  """
+  Assembles bar matrices into a global sparse matrix.
+  
+  :param conn: node indices of each bar.
+  :type conn: (nb, 2) int array
+  :param Ke: bar matrices.
+  :type Ke: (nb, 2 * dim, 2 * dim) float array
+  :param nn: number of nodes.
+  :type nn: int
+  :rtype: ``scipy.sparse.csr_matrix`` of shape (dim * nn, dim * nn)
+  """
+  ne = Ke.shape[1]
+  dim = ne // 2
+  dof = bar_dofs(conn, dim)
+  rows = np.repeat(dof, ne, axis = 1)
+  cols = np.tile(dof, (1, ne))
+  K = coo_matrix((Ke.ravel(), (rows.ravel(), cols.ravel())), 
+                 shape = (dim * nn, dim * nn))
+  return K.tocsr()
+
+def assemble_stiffness(coords, conn, stiffness):
+  """
+  Assembles the global stiffness matrix of a set of bars in a single batch.
+  
+  :param coords: node coordinates.
+  :type coords: (nn, dim) float array
+  :param conn: node indices of each bar.
+  :type conn: (nb, 2) int array
+  :param stiffness: product of the modulus and the section of each bar.
+  :type stiffness: (nb,) float array
+  :rtype: ``scipy.sparse.csr_matrix`` of shape (dim * nn, dim * nn)
+  """
+  nn = len(coords)
+  d = coords[conn[:, 1]] - coords[conn[:, 0]]
+  L = (d**2).sum(axis = 1)**.5
+  u = d / L[:, np.newaxis]
+  k = stiffness / L
+  a = np.concatenate([-u, u], axis = 1)
+  Ke = k[:, np.newaxis, np.newaxis] * a[:, :, np.newaxis] * a[:, np.newaxis, :]
+  return assemble_bar_matrices(conn, Ke, nn)
+
+DENSE_SOLVER_MAX_DOF = 2000
+DIRECT_SOLVER_MAX_DOF = 200000
+# Sparse LU fill-in grows much faster on space trusses.
+DIRECT_SOLVER_MAX_DOF_3D = 5000
+
+def select_solver(n, dim = 2):
+  """
+  Returns the default solver backend for a system with ``n`` unknowns.
+  """
+  if n <= DENSE_SOLVER_MAX_DOF: return "dense"
+  if n <= (DIRECT_SOLVER_MAX_DOF if dim == 2 else DIRECT_SOLVER_MAX_DOF_3D): 
+    return "splu"
+  return "cg"
+
+def solve_linear(K, f, solver = "auto", preconditioner = "jacobi", tol = 1.e-10):
+  """
+  Solves the linear system ``K u = f`` with a given backend.
+  
+  :param K: symmetric positive definite matrix.
+  :type K: ``scipy.sparse`` matrix
+  :param f: right hand side.
+  :type f: float array
+  :param solver: "dense" (``numpy.linalg.solve``), "splu" (sparse LU 
+    factorization), "cg" (preconditioned conjugate gradient) or "auto" which 
+    chooses among them using the size of the system (see ``select_solver``).
+  :type solver: string
+  :param preconditioner: "jacobi" (diagonal), "ilu" (incomplete factorization) 
+    or None. Only used by the "cg" solver.
+  :type preconditioner: string
+  :param tol: relative tolerance of the "cg" solver.
+  :type tol: float
+  :rtype: float array
+  """
+  n = K.shape[0]
+  if n == 0: return np.zeros(0)
+  if solver == "auto": solver = select_solver(n)
+  if solver == "dense":
+    return np.linalg.solve(K.toarray(), f)
+  if solver == "splu":
+    return splu(K.tocsc()).solve(f)
+  if solver == "cg":
+    if preconditioner == "jacobi":
+      d = K.diagonal()
+      M = LinearOperator((n, n), matvec = lambda x: x / d)
+    elif preconditioner == "ilu":
+      M = spilu(K.tocsc()).solve
+      M = LinearOperator((n, n), matvec = M)
+    elif preconditioner == None:
+      M = None
+    else:
+      raise ValueError("Unknown preconditioner: {0}".format(preconditioner))
+    u, info = cg(K, f, rtol = tol, maxiter = 10 * n, M = M)
+    if info != 0:
+      raise RuntimeError("Conjugate gradient did not converge (info = {0})".format(info))
+    return u
+  raise ValueError("Unknown solver: {0}".format(solver))
+
+
+class Factorization(object):
+  """
+  Factorization of the stiffness matrix reduced to the active degrees of 
+  freedom, used to solve any number of load cases by back substitution.
+  
+  :param K: full stiffness matrix.
+  :type K: ``scipy.sparse`` matrix
+  :param adof: active degrees of freedom.
+  :type adof: int array
+  :param solver: "dense" (Cholesky) or "splu" (sparse LU).
+  :type solver: string
+  """
+  def __init__(self, K, adof, solver = "splu"):
+    self.K = K
+    self.adof = adof
+    self.solver = solver
+    Kr = K[adof][:, adof]
+    if solver == "dense":
+      self._factor = cho_factor(Kr.toarray())
+    elif solver == "splu":
+      self._factor = splu(Kr.tocsc())
+    else:
+      raise ValueError("Solver {0} does not provide a factorization.".format(solver))
+  
+  def solve(self, f):
+    """
+    Returns the displacements for one or several force vectors. Blocked 
+    degrees of freedom have zero displacement.
+    
+    :param f: force vector(s).
+    :type f: (dim * nn,) or (n_cases, dim * nn) float array
+    :rtype: float array with the same shape as ``f``
+    """
+    f = np.asarray(f, dtype = np.float64)
+    u = np.zeros_like(f)
+    adof = self.adof
+    if len(adof) == 0: return u
+    fr = f[..., adof].T
+    if self.solver == "dense":
+      ur = cho_solve(self._factor, fr)
+    else:
+      ur = self._factor.solve(np.ascontiguousarray(fr))
+    u[..., adof] = ur.T
+    return u
+
+
+class ArrayStore(object):
+  """
+  A growable struct of arrays: each field is stored in a contiguous array 
+  whose first axis is the item index.
+  
+  :param fields: field names mapped to their (item shape, dtype, default).
+  :type fields: dict
+  :param capacity: initial number of allocated items.
+  :type capacity: int
+  """
+  def __init__(self, fields, capacity = 1):
+    self.fields = fields
+    self.size = 0
+    self.arrays = {name: np.full((capacity,) + shape, default, dtype = dtype) 
+                   for name, (shape, dtype, default) in fields.items()}
+  
+  @classmethod
+  def from_arrays(cls, fields, size, arrays):
+    """
+    Creates a store of ``size`` items that uses the given arrays (e.g. memory 
+    maps) without copying them. Missing fields take their default value.
+    """
+    store = cls(fields, capacity = size)
+    store.size = size
+    for name, array in arrays.items():
+      store.arrays[name] = array
+    return store
+  
+  def __len__(self):
+    return self.size
+  
+  def __getitem__(self, name):
+    """
+    Returns a view on the used part of a field.
+    """
+    return self.arrays[name][:self.size]
+  
+  def __setitem__(self, name, value):
+    self.arrays[name][:self.size] = value
+  
+  def reserve(self, capacity):
+    """
+    Grows the allocated arrays so that they can hold ``capacity`` items.
+    """
+    old = len(self.arrays[next(iter(self.fields))])
+    if capacity <= old: return
+    capacity = max(capacity, 2 * old)
+    for name, (shape, dtype, default) in self.fields.items():
+      array = np.full((capacity,) + shape, default, dtype = dtype)
+      array[:self.size] = self.arrays[name][:self.size]
+      self.arrays[name] = array
+  
+  def append(self, **values):
+    """
+    Appends an item and returns its index. Missing fields take their default value.
+    """
+    self.reserve(self.size + 1)
+    index = self.size
+    self.size += 1
+    for name, value in values.items():
+      self.arrays[name][index] = value
+    return index
+  
+  def extend(self, count, **values):
+    """
+    Appends ``count`` items at once and returns the index of the first one. 
+    Values are broadcast to the new items, missing fields take their default 
+    value.
+    """
+    self.reserve(self.size + count)
+    start = self.size
+    self.size += count
+    for name, value in values.items():
+      self.arrays[name][start:self.size] = value
+    return start
+  
+  def item(self, index):
+    """
+    Returns the values of all fields for one item.
+    """
+    return {name: self.arrays[name][index] for name in self.fields}
+
+
+class ArrayField(object):
+  """
+  Descriptor exposing one row of an ``ArrayStore`` field as an attribute of a 
+  view object having ``_store`` and ``_index`` attributes. Vector fields are 
+  returned as writable views.
+  """
+  def __init__(self, name):
+    self.name = name
+  
+  def __get__(self, obj, cls = None):
+    if obj is None: return self
+    return obj._store.arrays[self.name][obj._index]
+  
+  def __set__(self, obj, value):
+    obj._store.arrays[self.name][obj._index] = value
+
+
+class ViewList(MutableSequence):
+  """
+  List of the node (or bar) views of an ``ArrayStore`` created on first 
+  access, so that opening or bulk building a large model does not create 
+  every view. Item ``i`` views the row ``i`` of the store.
+  
+  :param store: node or bar arrays.
+  :type store: ``ArrayStore`` instance
+  :param nodes: node views of the model for a list of bars, None for a list of nodes.
+  :type nodes: sequence of ``Node`` instances
+  """
+  def __init__(self, store, nodes = None):
+    self.store = store
+    self.nodes = nodes
+    self._items = [None] * len(store)
+  
+  def _view(self, index):
+    item = self._items[index]
+    if item is None:
+      if self.nodes is None:
+        item = Node.view(self.store, index)
+      else:
+        c0, c1 = self.store.arrays["conn"][index]
+        item = Bar.view(self.store, index, [self.nodes[c0], self.nodes[c1]])
+      self._items[index] = item
+    return item
+  
+  def __getitem__(self, index):
+    indices = range(len(self._items))[index]
+    if isinstance(index, slice): return [self._view(i) for i in indices]
+    return self._view(indices)
+  
+  def __setitem__(self, index, value):
+    self._items[index] = value
+  
+  def __delitem__(self, index):
+    del self._items[index]
+  
+  def __len__(self):
+    return len(self._items)
+  
+  def insert(self, index, value):
+    self._items.insert(index, value)
+  
+  def grow(self, count):
+    """
+    Appends ``count`` views of the next rows of the store, created lazily.
+    """
+    self._items.extend([None] * count)
+  
+  def __repr__(self):
+    return repr(list(self))
+
+
+def store_property(store, name):
+  """
+  Returns a property exposing the field ``name`` of the ``ArrayStore`` 
+  attribute ``store`` of a model.
+  """
+  def getter(self):
+    return getattr(self, store)[name]
+  def setter(self, value):
+    getattr(self, store)[name] = value
+  return property(getter, setter, 
+                  doc = "Array of the {0} of all {1}.".format(name, store[1:]))
+
+
+def node_fields(dim = 2):
+  """
+  Returns the ``ArrayStore`` fields of the nodes of a ``dim`` dimensional truss.
+  """
+  return {"coords":       ((dim,), np.float64, 0.),
+          "displacement": ((dim,), np.float64, 0.),
+          "force":        ((dim,), np.float64, 0.),
+          "block":        ((dim,), np.bool_, False),
+          "label":        ((), object, None),
+          "block_side":   ((), np.int64, 1)}
+
+BAR_FIELDS = {"conn":         ((2,), np.int64, -1),
+              "section":      ((), np.float64, 1.),
+              "modulus":      ((), np.float64, 1.),
+              "density":      ((), np.float64, 1.),
+              "yield_stress": ((), np.float64, .001),
+              "tension":      ((), np.float64, 0.),
+              "elongation":   ((), np.float64, 0.),
+              "strain":       ((), np.float64, 0.),
+              "stress":       ((), np.float64, 0.),
+              "plastic_strain": ((), np.float64, 0.)}
+
 
 class Model(object):
   """
   Truss model
+  
+  The nodes and bars data are stored in contiguous arrays (see ``ArrayStore``) 
+  exposed as model attributes (``coords``, ``displacement``, ``force``, 
+  ``block``, ``conn``, ``section``, ``modulus``, ``density``, ...). ``Node`` 
+  and ``Bar`` instances are lightweight views on a row of these arrays.
+  
+  :param dim: number of space dimensions, 2 (plane truss) or 3 (space truss). 
+    Nodal vectors have ``dim`` components and the global vectors and 
+    matrices have ``dim * nn`` degrees of freedom.
+  :type dim: int
   """
-  def __init__(self):
-    self.nodes = []
-    self.bars = []
+  def __init__(self, dim = 2):
+    if dim not in (2, 3):
+      raise ValueError("dim should be 2 or 3, got {0}".format(dim))
+    self.dim = dim
+    self._nodes = ArrayStore(node_fields(dim))
+    self._bars = ArrayStore(BAR_FIELDS)
+    self.nodes = ViewList(self._nodes)
+    self.bars = ViewList(self._bars, self.nodes)
+    self._factorization = None
+    self._factorization_key = None
+  
+  def __getstate__(self):
+    """
+    Returns the state used by ``pickle`` and ``copy`` without the cached 
+    factorization, which may hold an unpicklable ``SuperLU`` object.
+    """
+    state = self.__dict__.copy()
+    state["_factorization"] = None
+    state["_factorization_key"] = None
+    return state
+  
+  def __deepcopy__(self, memo):
+    new = self.__class__.__new__(self.__class__)
+    memo[id(self)] = new
+    new.__dict__.update(copy.deepcopy(self.__getstate__(), memo))
+    return new
+  
+  coords = store_property("_nodes", "coords")
+  displacement = store_property("_nodes", "displacement")
+  force = store_property("_nodes", "force")
+  block = store_property("_nodes", "block")
+  conn = store_property("_bars", "conn")
+  section = store_property("_bars", "section")
+  modulus = store_property("_bars", "modulus")
+  density = store_property("_bars", "density")
+  yield_stress = store_property("_bars", "yield_stress")
+  tension = store_property("_bars", "tension")
+  plastic_strain = store_property("_bars", "plastic_strain")
+  elongation = store_property("_bars", "elongation")
+  strain = store_property("_bars", "strain")
+  stress = store_property("_bars", "stress")
   
   def data(self, at = "nodes"):
     """
@@ -42,10 +450,93 @@ class Model(object):
     2 -9.52381e-05 -6.73435e-05 -1.41421e+07     -1414.21  
     3 -5.42101e-20 -5.42101e-20 -1.13841e-08 -1.13841e-12  
     4            0            0            0            0  
+    
+    The dataframe is built column by column from the model arrays so that 
+    each column keeps a numeric dtype.
     """
-    out = pd.concat([t.data() for t in getattr(self, at)], axis = 1)
-    out = out.transpose()
-    return out
+    labels = self._nodes["label"]
+    axes = "xyz"[:self.dim]
+    if at == "nodes":
+      columns = {("label", "o") : labels}
+      for group, prefix, values in (("coords", "", self.coords), 
+                                    ("disp", "u", self.displacement), 
+                                    ("force", "F", self.force), 
+                                    ("block", "b", self.block)):
+        for i, axis in enumerate(axes):
+          columns[(group, prefix + axis)] = values[:, i]
+    elif at == "bars":
+      conn = self.conn
+      lengths = self.lengths()
+      directions = self.vectors() / lengths[:, np.newaxis]
+      volumes = self.section * lengths
+      columns = {("conn", "c1"): labels[conn[:, 0]],
+                 ("conn", "c2"): labels[conn[:, 1]],
+                 ("props", "section"): self.section,
+                 ("props", "density"): self.density,
+                 ("state", "tension"): self.tension,
+                 ("state", "elongation"): self.elongation,
+                 ("state", "strain"): self.strain,
+                 ("state", "stress"): self.stress,
+                 ("state", "failure"): self.yield_stress - abs(self.stress) <= 0., 
+                 ("geometry", "volume"): volumes,
+                 ("geometry", "length"): lengths,
+                 ("props", "mass"): volumes * self.density,
+                 }
+      for i, axis in enumerate(axes):
+        columns[("direction", "d" + axis)] = directions[:, i]
+    else:
+      raise ValueError("at should be 'nodes' or 'bars', got {0}".format(at))
+    return pd.DataFrame({k: np.array(v) for k, v in columns.items()})
+  
+  def dump_data(self, path, at = "bars", format = None):
+    """
+    Writes the data returned by ``data`` to a file.
+    
+    :param path: output file path.
+    :type path: string
+    :param at: should be 'nodes' or 'bars'.
+    :type at: string
+    :param format: "parquet", "feather" (both require ``pyarrow``) or "npz". 
+      If None, it is deduced from the file extension.
+    :type format: string
+    """
+    if format == None: format = os.path.splitext(path)[1][1:]
+    data = self.data(at = at)
+    data.columns = [".".join(c) for c in data.columns]
+    if format == "parquet":
+      data.to_parquet(path)
+    elif format == "feather":
+      data.to_feather(path)
+    elif format == "npz":
+      arrays = {}
+      for name, column in data.items():
+        values = column.to_numpy()
+        if values.dtype == object: values = values.astype(str)
+        arrays[name] = values
+      np.savez(path, **arrays)
+    else:
+      raise ValueError("Unknown format: {0}".format(format))
+  
+  def save(self, path):
+    """
+    Saves the model in a directory holding one raw ``.npy`` file per node and 
+    bar array and a small ``model.json`` header, see ``load_model``.
+    
+    :param path: directory path, created if needed.
+    :type path: string
+    """
+    if not os.path.isdir(path): os.makedirs(path)
+    header = {"version": 1, "dim": self.dim, 
+              "nodes": len(self.nodes), "bars": len(self.bars)}
+    for kind, store in (("nodes", self._nodes), ("bars", self._bars)):
+      for name in store.fields:
+        array = store[name]
+        if name == "label":
+          if all(label is None for label in array): continue
+          array = np.array(["" if l is None else str(l) for l in array])
+        np.save(os.path.join(path, "{0}.{1}.npy".format(kind, name)), array)
+    with open(os.path.join(path, "model.json"), "w") as f:
+      json.dump(header, f)
   
   def nodes_data(self):
     """
@@ -70,50 +561,171 @@ class Model(object):
     <Node B: x = 4.0, y = 5.0>
     """
     if isinstance(node, Node) == False:
-      node = Node(node, *args, **kwargs)
+      node = Node(node, *args, store = self._nodes, **kwargs)
+    else:
+      node.move_to(self._nodes)
     self.nodes.append(node)  
     return node
   
-  def add_bar(self,*args , **kwargs):
+  def add_bar(self, n1, n2, *args , **kwargs):
     """
-    Add a bar to the model.
+    Add a bar to the model. Both nodes must already belong to the model.
     
     >>> from truss.core import Node, Bar, Model
     >>> m = Model()
     >>> B = m.add_node((0., 1.), label = "B")
     >>> A = m.add_node((0., 0.), label = "A")
-    >>> b = Bar(A, B)
+    >>> b = m.add_bar(A, B)
     """
-    bar = Bar(*args , **kwargs)
+    for node in (n1, n2):
+      if node._store is not self._nodes:
+        raise ValueError("Node {0} does not belong to the model.".format(node.label))
+    bar = Bar(n1, n2, *args , store = self._bars, **kwargs)
     self.bars.append(bar)
     return bar
   
+  def add_nodes(self, coords, labels = None, force = None, block = None):
+    """
+    Adds many nodes at once, directly into the model arrays.
+    
+    :param coords: coordinates of the nodes.
+    :type coords: (n, dim) float array
+    :param labels: labels of the nodes.
+    :type labels: sequence of length n
+    :param force: external forces, zero if None.
+    :type force: (n, dim) float array
+    :param block: blocked degrees of freedom, none if None.
+    :type block: (n, dim) boolean array
+    :returns: indices of the new nodes.
+    :rtype: int array
+    """
+    coords = np.asarray(coords, dtype = np.float64).reshape(-1, self.dim)
+    values = {"coords": coords}
+    if labels is not None: values["label"] = np.asarray(labels, dtype = object)
+    if force is not None: values["force"] = force
+    if block is not None: values["block"] = block
+    start = self._nodes.extend(len(coords), **values)
+    self.nodes.grow(len(coords))
+    return np.arange(start, start + len(coords))
+  
+  def add_bars(self, conn, section = 1., modulus = 1., density = 1., yield_stress = .001):
+    """
+    Adds many bars at once, directly into the model arrays. Properties are 
+    either scalars or arrays with one value per bar.
+    
+    :param conn: indices of the start and end nodes of the bars.
+    :type conn: (n, 2) int array
+    :returns: indices of the new bars.
+    :rtype: int array
+    """
+    conn = np.asarray(conn, dtype = np.int64).reshape(-1, 2)
+    if len(conn) and (conn.min() < 0 or conn.max() >= len(self.nodes)):
+      raise ValueError("Bar node indices out of range.")
+    start = self._bars.extend(len(conn), conn = conn, section = section, 
+                              modulus = modulus, density = density, 
+                              yield_stress = yield_stress)
+    self.bars.grow(len(conn))
+    return np.arange(start, start + len(conn))
+  
   def __repr__(self):
     return "<Model: {0} nodes, {1} bars>".format(len(self.nodes), len(self.bars))
     
-  def stiffness_matrix(self):
+  def stiffness_matrix(self, sparse = False):
     """
     Returns the full assembled stiffness matrix of the model.
+    
+    All the bar contributions are computed at once and assembled in a single 
+    COO batch so that the cost grows linearly with the number of bars.
+    
+    :param sparse: if True, a ``scipy.sparse`` CSR matrix is returned, else a dense array.
+    :type sparse: Bool
     """
-    nodes = np.array(self.nodes)
-    bars = self.bars
-    nn = len(nodes)
-    nb = len(bars)
-    K = np.zeros([2 * nn, 2 * nn])
-    for b in bars:
-      conn = b.conn
-      i0 = np.where(nodes == conn[0])[0][0]
-      i1 = np.where(nodes == conn[1])[0][0]
-      Kb = b.stiffness_matrix()
-      Kb_bar = Kb[0:2,0:2]
-      K[2*i0:2*i0 +2,2*i0:2*i0 +2] += Kb_bar
-      K[2*i1:2*i1 +2,2*i1:2*i1 +2] += Kb_bar
-      K[2*i0:2*i0 +2,2*i1:2*i1 +2] -= Kb_bar
-      K[2*i1:2*i1 +2,2*i0:2*i0 +2] -= Kb_bar
-    return K
+    K = assemble_stiffness(self.coords, self.conn, self.modulus * self.section)
+    if sparse: return K
+    return K.toarray()
+  
+  def mass_matrix(self, lumped = True, sparse = False):
+    """
+    Returns the full assembled mass matrix of the model.
+    
+    :param lumped: if True, half of the mass of each bar is lumped on each of 
+      its nodes (diagonal matrix), else the consistent bar mass matrix is used.
+    :type lumped: Bool
+    :param sparse: if True, a ``scipy.sparse`` CSR matrix is returned, else a dense array.
+    :type sparse: Bool
+    """
+    nn = len(self.nodes)
+    m = self.masses()
+    if lumped:
+      M = np.bincount(self.conn.ravel(), np.repeat(m / 2., 2), minlength = nn)
+      M = diags(np.repeat(M, self.dim)).tocsr()
+    else:
+      I = np.eye(self.dim)
+      Me = (m / 6.)[:, np.newaxis, np.newaxis] * np.block([[2. * I, I], [I, 2. * I]])
+      M = assemble_bar_matrices(self.conn, Me, nn)
+    if sparse: return M
+    return M.toarray()
+  
+  def connectivity(self):
+    """
+    Returns the (nb, 2) array of the node indices of each bar.
+    """
+    return self.conn
+  
+  def lengths(self, deformed = False):
+    """
+    Returns the lengths of all bars.
+    
+    :param deformed: False for undeformed configuration, True for deformed configuration.
+    :type deformed: Bool
+    :rtype: (nb,) float array
+    """
+    d = self.vectors(deformed)
+    return (d**2).sum(axis = 1)**.5
+  
+  def vectors(self, deformed = False):
+    """
+    Returns the vectors joining the start node to the end node of all bars.
     
+    :rtype: (nb, dim) float array
+    """
+    pos = self.coords
+    if deformed: pos = pos + self.displacement
+    conn = self.conn
+    return pos[conn[:, 1]] - pos[conn[:, 0]]
   
+  def directions(self, deformed = False):
+    """
+    Returns the unit vectors corresponding to the direction of all bars.
+    
+    :rtype: (nb, dim) float array
+    """
+    d = self.vectors(deformed)
+    return d / ((d**2).sum(axis = 1)**.5)[:, np.newaxis]
   
+  def volumes(self):
+    """
+    Returns the (undeformed) volumes of all bars.
+    
+    :rtype: (nb,) float array
+    """
+    return self.section * self.lengths()
+  
+  def masses(self):
+    """
+    Returns the masses of all bars.
+    
+    :rtype: (nb,) float array
+    """
+    return self.volumes() * self.density
+  
+  def stiffnesses(self):
+    """
+    Returns the stiffnesses of all bars.
+    
+    :rtype: (nb,) float array
+    """
+    return self.modulus * self.section / self.lengths()
   
   def add_force(self, node, magnitude):
     """
@@ -131,70 +743,374 @@ class Model(object):
     """
     Returns the full force vector applied on the system.
     """
-    nodes = self.nodes
-    force_vector = np.array([n.force for n in nodes]).flatten()
-    return force_vector
+    return self.force.flatten()
   
-  def solve(self):
+  def solve(self, solver = "auto", preconditioner = "jacobi", tol = 1.e-10):
     """
     Solves the system.
+    
+    :param solver: linear solver backend, see ``solve_linear``.
+    :type solver: string
+    :param preconditioner: preconditioner used by the "cg" solver.
+    :type preconditioner: string
+    :param tol: relative tolerance of the "cg" solver.
+    :type tol: float
     """
     adof = self.active_dof()
-    nodes = self.nodes
-    nn = len(nodes)
-    u = np.zeros(2 * nn)
-    K = self.stiffness_matrix()
-    Adof1, Adof0 = np.meshgrid(adof, adof)
-    Kr = K[(Adof0, Adof1)]
     f = self.force_vector()
-    fr = f[adof]
-    u[adof] = np.linalg.solve(Kr,fr)
-    nodes = np.array(self.nodes)
-    f = np.dot(K, u)
-    for i in range(len(nodes)):
-      node = nodes[i]
-      for j in range(2):
-        node.displacement[j] = u[2*i+j]
-        if node.block[j]: node.force[j] = f[2*i+j]
-          
-      
-    bars = self.bars
-    for bar in bars:
-      n0 = bar.conn[0]
-      n1 = bar.conn[1]
-      bar.elongation = (n1.displacement - n0.displacement).dot(bar.direction())  
-      bar.tension = bar.elongation * bar.stiffness()
-      bar.strain = bar.elongation / bar.length()
-      bar.stress = bar.tension / bar.section 
-   
+    if solver == "auto": solver = select_solver(len(adof), self.dim)
+    if solver == "cg":
+      u = np.zeros(self.dim * len(self.nodes))
+      K = self.stiffness_matrix(sparse = True)
+      u[adof] = solve_linear(K[adof][:, adof], f[adof], solver = solver, 
+                             preconditioner = preconditioner, tol = tol)
+    else:
+      factorization = self.factorize(solver)
+      K = factorization.K
+      u = factorization.solve(f)
+    self.postprocess(u, K.dot(u))
+  
+  def arrays(self):
+    """
+    Returns a compact copy of the model as a dict of arrays, which is cheap to 
+    pickle and is all ``solve_arrays`` needs.
+    
+    :rtype: dict
+    """
+    out = {name: self._nodes[name].copy() for name in ("coords", "force", "block")}
+    for name in ("conn", "section", "modulus", "density", "yield_stress"):
+      out[name] = self._bars[name].copy()
+    return out
+  
+  def factorization_key(self):
+    """
+    Returns a digest of the data the stiffness matrix depends on: geometry, 
+    connectivity, sections, moduli and boundary conditions.
+    """
+    h = hashlib.sha1()
+    for store, name in (("_nodes", "coords"), ("_nodes", "block"), 
+                        ("_bars", "conn"), ("_bars", "section"), 
+                        ("_bars", "modulus")):
+      h.update(np.ascontiguousarray(getattr(self, store)[name]).tobytes())
+    return h.hexdigest()
+  
+  def factorize(self, solver = "auto"):
+    """
+    Returns the factorization of the reduced stiffness matrix. It is cached 
+    and only recomputed when the result of ``factorization_key`` changes.
+    
+    :param solver: "dense", "splu" or "auto".
+    :type solver: string
+    :rtype: ``Factorization`` instance
+    """
+    adof = self.active_dof()
+    if solver == "auto":
+      solver = "dense" if len(adof) <= DENSE_SOLVER_MAX_DOF else "splu"
+    key = (self.factorization_key(), solver)
+    if key != self._factorization_key:
+      K = self.stiffness_matrix(sparse = True)
+      self._factorization = Factorization(K, adof, solver = solver)
+      self._factorization_key = key
+    return self._factorization
+  
+  def solve_many(self, forces, solver = "auto"):
+    """
+    Solves several load cases at once using the cached factorization. The 
+    state of the model is not modified.
+    
+    :param forces: one force vector per load case.
+    :type forces: (n_cases, dim * nn) float array
+    :param solver: "dense", "splu" or "auto".
+    :type solver: string
+    :returns: displacements and nodal forces (including reactions) of each case.
+    :rtype: two (n_cases, dim * nn) float arrays
+    """
+    factorization = self.factorize(solver)
+    U = factorization.solve(np.atleast_2d(forces))
+    F = factorization.K.dot(U.T).T
+    return U, F
+  
+  def postprocess(self, u, f):
+    """
+    Writes back the displacements and reactions of all nodes and computes the 
+    elongation, strain, stress and tension of all bars at once.
+    
+    :param u: displacement vector.
+    :type u: (dim * nn,) float array
+    :param f: nodal forces ``K u``, only the blocked degrees of freedom are written back.
+    :type f: (dim * nn,) float array
+    """
+    nn = len(self.nodes)
+    self.displacement = u.reshape(nn, self.dim)
+    block = self.block
+    self.force[block] = f.reshape(nn, self.dim)[block]
+    d = self.vectors()
+    L = (d**2).sum(axis = 1)**.5
+    conn = self.conn
+    du = self.displacement[conn[:, 1]] - self.displacement[conn[:, 0]]
+    elongation = (du * d).sum(axis = 1) / L
+    strain = elongation / L
+    self.elongation = elongation
+    self.strain = strain
+    self.stress = self.modulus * strain
+    self.tension = self.modulus * self.section * strain
+  
+  def bar_response(self, u, plastic_strain, tangent = False):
+    """
+    Returns the internal forces of the truss for a given displacement using 
+    corotational bar kinematics and an elastic-perfectly-plastic material.
+    
+    :param u: displacement vector.
+    :type u: (dim * nn,) float array
+    :param plastic_strain: plastic strain of each bar at the last converged state.
+    :type plastic_strain: (nb,) float array
+    :param tangent: if True, the sparse tangent stiffness matrix is also 
+      assembled, else None is returned in its place.
+    :type tangent: Bool
+    :returns: internal force vector, bar strains, stresses and updated plastic 
+      strains, tangent matrix.
+    :rtype: tuple
+    """
+    nn, dim = len(self.nodes), self.dim
+    conn = self.conn
+    u = u.reshape(nn, dim)
+    d0 = self.vectors()
+    du = u[conn[:, 1]] - u[conn[:, 0]]
+    d = d0 + du
+    l = (d**2).sum(axis = 1)**.5
+    e = d / l[:, np.newaxis]
+    L = (d0**2).sum(axis = 1)**.5
+    E, S = self.modulus, self.section
+    # l - L = (l**2 - L**2) / (l + L) avoids the cancellation of small elongations.
+    strain = (2. * (d0 * du).sum(axis = 1) + (du**2).sum(axis = 1)) / (l + L) / L
+    trial = E * (strain - plastic_strain)
+    yielded = np.abs(trial) > self.yield_stress
+    stress = np.where(yielded, np.sign(trial) * self.yield_stress, trial)
+    plastic_strain = strain - stress / E
+    N = stress * S
+    a = np.concatenate([-e, e], axis = 1)
+    f = np.bincount(bar_dofs(conn, dim).ravel(), (N[:, np.newaxis] * a).ravel(), 
+                    minlength = dim * nn)
+    K = None
+    if tangent:
+      Et = np.where(yielded, 0., E)
+      Ke = (Et * S / L)[:, np.newaxis, np.newaxis] * a[:, :, np.newaxis] * a[:, np.newaxis, :]
+      G = (N / l)[:, np.newaxis, np.newaxis] * (np.eye(dim) - e[:, :, np.newaxis] * e[:, np.newaxis, :])
+      Ke += np.block([[G, -G], [-G, G]])
+      K = assemble_bar_matrices(conn, Ke, nn)
+    return f, strain, stress, plastic_strain, K
+  
+  def iter_nonlinear(self, steps = 10, tol = 1.e-8, max_iter = 30, reuse_tangent = True, reuse_ratio = .5, stall_tol = 1.e-6):
+    """
+    Incremental Newton-Raphson solver for large displacements and plasticity, 
+    starting from the unloaded state. The nodal forces of the model are 
+    applied in ``steps`` equal load increments. This generator yields the 
+    convergence data of each load step after writing the converged state 
+    back to the model, and stops after the first step that does not converge 
+    (e.g. collapse), leaving the model in the last converged state.
+    
+    :param steps: number of load steps.
+    :type steps: int
+    :param tol: tolerance on the residual norm relative to the norm of the full load.
+    :type tol: float
+    :param max_iter: maximum number of iterations per step.
+    :type max_iter: int
+    :param reuse_tangent: if True, the factorized tangent matrix is kept 
+      between iterations as long as the residual norm decreases by a factor 
+      ``reuse_ratio`` at least (modified Newton-Raphson).
+    :type reuse_tangent: Bool
+    :param reuse_ratio: residual decrease below which the tangent is updated.
+    :type reuse_ratio: float
+    :param stall_tol: a step whose residual norm stops decreasing after a 
+      tangent update is considered converged (``stalled`` data) if this norm 
+      is below ``stall_tol``: the residual has reached its round-off floor.
+    :type stall_tol: float
+    :rtype: generator of dicts
+    """
+    nn, dim = len(self.nodes), self.dim
+    adof = self.active_dof()
+    f_ref = self.force_vector()
+    f_norm = np.linalg.norm(f_ref[adof])
+    if f_norm == 0.: f_norm = 1.
+    u = np.zeros(dim * nn)
+    plastic = np.zeros(len(self.bars))
+    for step in range(1, steps + 1):
+      load_factor = step / steps
+      residuals = []
+      factorization = None
+      converged = stalled = fresh = False
+      # Diverging iterations are detected through non finite residuals.
+      with np.errstate(over = "ignore", invalid = "ignore"):
+        for iteration in range(max_iter + 1):
+          f_int, strain, stress, new_plastic, K = self.bar_response(u, plastic)
+          r = load_factor * f_ref - f_int
+          norm = np.linalg.norm(r[adof]) / f_norm
+          residuals.append(norm)
+          if norm <= tol:
+            converged = True
+            break
+          if fresh and norm <= stall_tol and norm >= residuals[-2]:
+            converged = stalled = True
+            break
+          if not np.isfinite(norm) or iteration == max_iter: break
+          fresh = (factorization is None or not reuse_tangent 
+                   or norm > reuse_ratio * residuals[-2])
+          if fresh:
+            K = self.bar_response(u, plastic, tangent = True)[-1]
+            try:
+              factorization = Factorization(K, adof, solver = "splu")
+            except RuntimeError:
+              break
+          u = u + factorization.solve(r)
+      info = {"step": step, "load_factor": load_factor, 
+              "iterations": iteration, "residuals": residuals, 
+              "converged": converged, "stalled": stalled}
+      if not converged:
+        yield info
+        return
+      plastic = new_plastic
+      L = self.lengths()
+      self.displacement = u.reshape(nn, dim)
+      block = self.block
+      self.force[block] = f_int.reshape(nn, dim)[block]
+      self.strain = strain
+      self.elongation = strain * L
+      self.stress = stress
+      self.tension = stress * self.section
+      self.plastic_strain = plastic
+      info["max_displacement"] = np.abs(u).max()
+      yield info
+  
+  def solve_nonlinear(self, *args, **kwargs):
+    """
+    Runs ``iter_nonlinear`` to the end and returns the convergence data of 
+    all load steps. Arguments are passed to ``iter_nonlinear``.
+    
+    :rtype: list of dicts
+    """
+    return list(self.iter_nonlinear(*args, **kwargs))
+  
+  def modes(self, k = 6, lumped = True):
+    """
+    Returns the first natural frequencies and mode shapes of the truss. Large 
+    models use the sparse shift-invert Lanczos solver ``eigsh``.
+    
+    :param k: number of modes.
+    :type k: int
+    :param lumped: see ``mass_matrix``.
+    :type lumped: Bool
+    :returns: frequencies [Hz] and mass normalized mode shapes.
+    :rtype: (k,) float array, (k, dim * nn) float array
+    """
+    adof = self.active_dof()
+    n = len(adof)
+    K = self.stiffness_matrix(sparse = True)[adof][:, adof]
+    M = self.mass_matrix(lumped = lumped, sparse = True)[adof][:, adof]
+    k = min(k, n)
+    if n <= DENSE_SOLVER_MAX_DOF or k >= n - 1:
+      w2, phi = eigh(K.toarray(), M.toarray(), subset_by_index = (0, k - 1))
+    else:
+      w2, phi = eigsh(K.tocsc(), k = k, M = M.tocsc(), sigma = 0., which = "LM")
+      order = np.argsort(w2)
+      w2, phi = w2[order], phi[:, order]
+    shapes = np.zeros((k, self.dim * len(self.nodes)))
+    shapes[:, adof] = phi.T
+    return np.abs(w2)**.5 / (2. * np.pi), shapes
+  
+  def iter_newmark(self, dt, nt, force = None, u0 = None, v0 = None, alpha = 0., damping = (0., 0.), lumped = True):
+    """
+    Newmark / Hilber-Hughes-Taylor time integration of the truss on the active 
+    degrees of freedom. The effective matrix is factorized once, so each step 
+    only costs a few sparse products and one back substitution. This 
+    generator yields ``(t, u, v, a)`` after each step, the arrays are reused 
+    from one step to the next and must be copied to be kept.
+    
+    :param dt: time step.
+    :type dt: float
+    :param nt: number of steps.
+    :type nt: int
+    :param force: function of time returning the (dim * nn,) force vector. If 
+      None, the current nodal forces are applied as a constant load.
+    :type force: callable
+    :param u0: initial displacement, zero if None.
+    :type u0: (dim * nn,) float array
+    :param v0: initial velocity, zero if None.
+    :type v0: (dim * nn,) float array
+    :param alpha: HHT parameter in [-1/3, 0], 0 gives the average acceleration 
+      Newmark scheme and negative values add numerical damping of high frequencies.
+    :type alpha: float
+    :param damping: Rayleigh coefficients ``(a0, a1)`` of ``C = a0 M + a1 K``.
+    :type damping: tuple
+    :param lumped: see ``mass_matrix``.
+    :type lumped: Bool
+    :rtype: generator
+    """
+    ndof = self.dim * len(self.nodes)
+    adof = self.active_dof()
+    beta = (1. - alpha)**2 / 4.
+    gamma = .5 - alpha
+    K = self.stiffness_matrix(sparse = True)[adof][:, adof]
+    M = self.mass_matrix(lumped = lumped, sparse = True)[adof][:, adof]
+    C = damping[0] * M + damping[1] * K
+    if force is None:
+      f_const = self.force_vector()
+      force = lambda t: f_const
+    full = lambda x: np.zeros(ndof) if x is None else np.asarray(x, dtype = np.float64)
+    u, v = full(u0)[adof], full(v0)[adof]
+    f = force(0.)[adof]
+    a = splu(M.tocsc()).solve(f - C.dot(v) - K.dot(u))
+    A = splu((M + (1. + alpha) * gamma * dt * C 
+                + (1. + alpha) * beta * dt**2 * K).tocsc())
+    U, V, Acc = np.zeros(ndof), np.zeros(ndof), np.zeros(ndof)
+    for step in range(1, nt + 1):
+      t = step * dt
+      f_new = force(t)[adof]
+      u_pred = u + dt * v + dt**2 * (.5 - beta) * a
+      v_pred = v + dt * (1. - gamma) * a
+      rhs = ((1. + alpha) * f_new - alpha * f 
+             - C.dot((1. + alpha) * v_pred - alpha * v)
+             - K.dot((1. + alpha) * u_pred - alpha * u))
+      a = A.solve(rhs)
+      u = u_pred + beta * dt**2 * a
+      v = v_pred + gamma * dt * a
+      f = f_new
+      U[adof], V[adof], Acc[adof] = u, v, a
+      yield t, U, V, Acc
+  
+  def newmark(self, dt, nt, save_every = 1, **kwargs):
+    """
+    Runs ``iter_newmark``, keeps the state every ``save_every`` steps and 
+    writes the final displacements back to the model. Other arguments are 
+    passed to ``iter_newmark``.
+    
+    :returns: times, displacements and velocities of the saved steps.
+    :rtype: (ns,) float array, (ns, dim * nn) float array, (ns, dim * nn) float array
+    """
+    times, U, V = [], [], []
+    u = np.zeros(self.dim * len(self.nodes))
+    for step, (t, u, v, a) in enumerate(self.iter_newmark(dt, nt, **kwargs), 1):
+      if step % save_every == 0 or step == nt:
+        times.append(t)
+        U.append(u.copy())
+        V.append(v.copy())
+    self.displacement = u.reshape(-1, self.dim)
+    return np.array(times), np.array(U), np.array(V)
   
   def active_dof(self):
     """
     Returns the indices of the active (i. e. not blocked) degrees of freedom.
     """
-    nodes = self.nodes
-    nn = len(nodes)
-    a = np.ones(2 * nn)
-    for i in range(nn):
-      if nodes[i].block[0]: a[2 * i    ] = 0 
-      if nodes[i].block[1]: a[2 * i + 1] = 0  
-    a = np.where(a == 1)[0]
-    return a
+    return np.where(self.block.ravel() == False)[0]
   
   
   def bbox(self, deformed = True, factor = .2):
     """
     Returns the bounding box of the truss.
     """
-    xlim = np.zeros(2)
-    ylim = np.zeros(2)
-    for n in self.nodes:
-      pos = n.coords.copy()
-      if deformed: pos += n.displacement
-      xlim[0] = min(xlim[0], pos[0])
-      xlim[1] = max(xlim[1], pos[0])
-      ylim[0] = min(ylim[0], pos[1])
-      ylim[1] = max(ylim[1], pos[1])
+    pos = self.coords
+    if deformed: pos = pos + self.displacement
+    xlim = np.array([min(0., pos[:, 0].min()), max(0., pos[:, 0].max())])
+    ylim = np.array([min(0., pos[:, 1].min()), max(0., pos[:, 1].max())])
     d = max(xlim[1]-xlim[0], ylim[1]-ylim[0])   
     xlim[0] -= d*factor
     xlim[1] += d*factor
@@ -202,7 +1118,7 @@ class Model(object):
     ylim[1] += d*factor
     return xlim, ylim
   
-  def draw(self, ax, deformed = True, field = "stress", label = True, forces = True, displacements = False, force_scale = 1., displacement_scale = 1.):
+  def draw(self, ax, deformed = True, field = "stress", label = True, forces = True, displacements = False, force_scale = 1., displacement_scale = 1., fast = False):
     """
     Draws the truss in ``matplotlib`` axes.
     
@@ -222,8 +1138,19 @@ class Model(object):
     :type force_scale: float
     :param displacement_scale: scale of the external displacement vector.
     :type displacement_scale: float
+    :param fast: if True, the whole truss is drawn with a few collections 
+      (see ``draw_collections``) which are returned.
+    :type fast: Bool
     
     """
+    if self.dim != 2:
+      raise NotImplementedError("Only plane trusses can be drawn.")
+    if fast:
+      return self.draw_collections(ax, deformed = deformed, field = field, 
+                                   forces = forces, 
+                                   displacements = displacements, 
+                                   force_scale = force_scale,
+                                   displacement_scale = displacement_scale)
     for node in self.nodes: node.draw(ax, deformed = deformed)
     bars = self.bars
     length = np.array([b.length for b in bars])
@@ -247,7 +1174,7 @@ class Model(object):
         color = colormap.to_rgba(getattr(bars[i], field))
       bars[i].draw(ax = ax, deformed = deformed, color = color)
     if field != None:
-      cbar = pyplot.colorbar(colormap)
+      cbar = pyplot.colorbar(colormap, ax = ax)
       cbar.set_label(cbar_label)    
     F = np.array([node.force for node in self.nodes]).transpose()
     P = np.array([node.coords for node in self.nodes]).transpose()
@@ -263,8 +1190,196 @@ class Model(object):
         upos = "tail"  
       qu = ax.quiver(P[0], P[1], U[0], U[1], scale_units='xy', angles = "xy", pivot=upos, scale=1., color = "green")
   
+  def draw_collections(self, ax, deformed = True, field = "stress", forces = True, displacements = False, force_scale = 1., displacement_scale = 1., radius = 0.1, linewidth = 3.):
+    """
+    Draws the truss in ``matplotlib`` axes using one collection for all the 
+    bars, one for all the nodes and one for all the supports, so that the 
+    rendering time hardly depends on the size of the truss. The returned 
+    artists can be passed to ``update_collections`` to animate the truss.
+    
+    :param ax: matplotlib axes.
+    :type ax: ``matplotlib.axes instance``
+    :param radius: radius of the nodes.
+    :type radius: float
+    :param linewidth: line width of the bars.
+    :type linewidth: float
+    
+    Other parameters are the same as in ``draw``.
+    
+    :rtype: dict of matplotlib artists
+    """
+    if self.dim != 2:
+      raise NotImplementedError("Only plane trusses can be drawn.")
+    pos = self.coords
+    if deformed: pos = pos + self.displacement
+    artists = {}
+    bars = LineCollection(pos[self.conn], linewidths = linewidth, cmap = cm.jet,
+                          colors = "black" if field == None else None)
+    ax.add_collection(bars)
+    artists["bars"] = bars
+    # Sized in data units, like the Circle patches of Node.draw and the 
+    # supports.
+    nodes = EllipseCollection(2. * radius, 2. * radius, 0., units = "xy", 
+                              offsets = pos, offset_transform = ax.transData,
+                              facecolors = "k", zorder = 3, clip_on = False)
+    ax.add_collection(nodes)
+    artists["nodes"] = nodes
+    index, shapes = self.support_shapes(radius)
+    supports = PolyCollection(shapes + pos[index][:, np.newaxis], 
+                              facecolors = "none", edgecolors = "black", 
+                              linewidths = 1.5, clip_on = False)
+    ax.add_collection(supports)
+    artists["supports"] = supports
+    if field != None:
+      labels = {"stress": "Normal stress, $\\sigma$ [Pa]", "tension": "Tension, $N$ [N]"}
+      bars.set_array(getattr(self, field))
+      bars.set_clim(self._field_limits(field))
+      cbar = pyplot.colorbar(bars, ax = ax)
+      cbar.set_label(labels[field])
+      artists["colorbar"] = cbar
+    F, U = self.force, self.displacement
+    if forces:
+      artists["forces"] = ax.quiver(pos[:, 0], pos[:, 1], F[:, 0], F[:, 1], 
+          scale_units = "xy", angles = "xy", pivot = "tail", 
+          scale = force_scale**-1, color = "red")
+    if displacements:
+      artists["displacements"] = ax.quiver(pos[:, 0], pos[:, 1], U[:, 0], U[:, 1], 
+          scale_units = "xy", angles = "xy", pivot = "tip" if deformed else "tail", 
+          scale = displacement_scale**-1, color = "green")
+    return artists
+  
+  def update_collections(self, artists, deformed = True, field = "stress", radius = 0.1):
+    """
+    Updates in place the artists returned by ``draw_collections`` with the 
+    current state of the truss.
+    
+    :param artists: artists returned by ``draw_collections``.
+    :type artists: dict
+    :param deformed: configuration to be plotted.
+    :type deformed: Bool
+    :param field: field to be plotted. Options are "tension", "stress" or None.
+    :type field: String
+    :param radius: radius of the nodes, as passed to ``draw_collections``.
+    :type radius: float
+    """
+    pos = self.coords
+    if deformed: pos = pos + self.displacement
+    artists["bars"].set_segments(pos[self.conn])
+    artists["nodes"].set_offsets(pos)
+    index, shapes = self.support_shapes(radius)
+    artists["supports"].set_verts(shapes + pos[index][:, np.newaxis])
+    if field != None:
+      artists["bars"].set_array(getattr(self, field))
+      artists["bars"].set_clim(self._field_limits(field))
+    F, U = self.force, self.displacement
+    if "forces" in artists:
+      artists["forces"].set_offsets(pos)
+      artists["forces"].set_UVC(F[:, 0], F[:, 1])
+    if "displacements" in artists:
+      artists["displacements"].set_offsets(pos)
+      artists["displacements"].set_UVC(U[:, 0], U[:, 1])
+  
+  def _field_limits(self, field):
+    values = getattr(self, field)
+    if len(values) == 0: return 0., 0.
+    return min(0., values.min()), max(0., values.max())
+  
+  def support_shapes(self, radius = 0.1):
+    """
+    Returns the support symbols of all blocked degrees of freedom as closed 
+    polygons with the same number of vertices, relative to their node.
+    
+    :rtype: (ns,) int array of node indices and (ns, nv, 2) float array of vertices
+    """
+    d = radius * 2.
+    theta = np.linspace(0., 2. * np.pi, 13)
+    circle = .5 * d * np.array([np.cos(theta), np.sin(theta)]).T
+    def triangle(verts):
+      verts = np.array(verts) * d
+      return np.concatenate([verts, np.repeat(verts[-1:], 9, axis = 0)])
+    shapes = [
+      [triangle([[-.1,0.], [-1.,.9], [-1.,-.9], [-.1, 0.]]),
+       circle + np.array([-1.5, .5]) * d, 
+       circle + np.array([-1.5, -.5]) * d],
+      [triangle([[0.,-.1], [-.9, -1.], [.9,-1.], [0., -.1]]),
+       circle + np.array([-.5, -1.5]) * d, 
+       circle + np.array([.5, -1.5]) * d]]
+    index, verts = [], []
+    for j in range(2):
+      nodes = np.where(self.block[:, j])[0]
+      for shape in shapes[j]:
+        index.append(nodes)
+        verts.append(np.repeat(shape[np.newaxis], len(nodes), axis = 0))
+    return np.concatenate(index), np.concatenate(verts)
+  
   def mass(self):
-    return np.array([b.mass() for b in self.bars]).sum()
+    """
+    Returns the total mass of the truss.
+    
+    :rtype: float
+    """
+    return self.masses().sum()
+  
+  def mass_gradient(self):
+    """
+    Returns the derivatives of the total mass with respect to the bar sections.
+    
+    :rtype: (nb,) float array
+    """
+    return self.density * self.lengths()
+  
+  def elongation_matrix(self):
+    """
+    Returns the sparse matrix ``B`` such that the bar elongations are ``B u``.
+    
+    :rtype: ``scipy.sparse.csr_matrix`` of shape (nb, dim * nn)
+    """
+    nb, nn, dim = len(self.bars), len(self.nodes), self.dim
+    conn = self.conn
+    u = self.directions()
+    rows = np.repeat(np.arange(nb), 2 * dim)
+    cols = bar_dofs(conn, dim)
+    values = np.concatenate([-u, u], axis = 1)
+    return coo_matrix((values.ravel(), (rows, cols.ravel())), 
+                      shape = (nb, dim * nn)).tocsr()
+  
+  def compliance(self):
+    """
+    Returns the compliance (work of the external forces) of the solved model.
+    
+    :rtype: float
+    """
+    adof = self.active_dof()
+    return self.force_vector()[adof].dot(self.displacement.ravel()[adof])
+  
+  def compliance_gradient(self):
+    """
+    Returns the derivatives of the compliance of the solved model with respect 
+    to the bar sections. No additional solve is needed since the problem is 
+    self adjoint.
+    
+    :rtype: (nb,) float array
+    """
+    return -self.modulus / self.lengths() * self.elongation**2
+  
+  def stress_gradient(self, solver = "auto"):
+    """
+    Returns the derivatives of the bar stresses of the solved model with 
+    respect to the bar sections, using the direct method: all the pseudo load 
+    cases are back substituted with the cached factorization.
+    
+    :param solver: "dense", "splu" or "auto".
+    :type solver: string
+    :returns: ``J[i, j]`` is the derivative of the stress in bar ``i`` with 
+      respect to the section of bar ``j``.
+    :rtype: (nb, nb) float array
+    """
+    factorization = self.factorize(solver)
+    B = self.elongation_matrix()
+    EL = self.modulus / self.lengths()
+    pseudo_forces = (B.T.multiply(-EL * self.elongation)).T
+    dU = factorization.solve(pseudo_forces.toarray())
+    return EL[:, np.newaxis] * B.dot(dU.T)
   
       
 class Node(object):
@@ -272,32 +1387,64 @@ class Node(object):
   Creates a node.
   
   :param coords: coordinates of the node.
-  :type coords: length 2 float array
-  :param force: external force applied on the node.
-  :type force: length 2 float array
-  :param block: bloked degrees of freedom.
-  :type block: length 2 boolean array
+  :type coords: length dim float array
+  :param force: external force applied on the node, zero if None.
+  :type force: length dim float array
+  :param block: bloked degrees of freedom, none if None.
+  :type block: length dim boolean array
   :param label: label of the node.
   :type label: string
+  :param store: node arrays the node is appended to. If None, a private one 
+    is created whose dimension is 3 for 3 coordinates and 2 otherwise.
+  :type store: ``ArrayStore`` instance
   
   >>> from truss.core import Node
   >>> A = Node((1.,5.), label = "A", block = (False, True) )
 
   """
+  __slots__ = ("_store", "_index")
+  coords = ArrayField("coords")
+  displacement = ArrayField("displacement")
+  force = ArrayField("force")
+  block = ArrayField("block")
+  label = ArrayField("label")
+  block_side = ArrayField("block_side")
+  
   def __init__(self, 
       coords = np.array([0., 0.]), 
       label = None, 
-      force = np.zeros(2),
-      block = np.array([False, False]), 
-      block_side = 1):
-  
-    coords = np.array(coords).astype(np.float64)[0:2]
-    self.coords = np.array(coords)
-    self.displacement = np.zeros(2)
-    self.force = np.array(force)
-    self.block = np.array(block)
-    self.label = label
-    self.block_side = block_side
+      force = None,
+      block = None, 
+      block_side = 1,
+      store = None):
+  
+    coords = np.array(coords).astype(np.float64)
+    if store is None: 
+      store = ArrayStore(node_fields(3 if len(coords) == 3 else 2))
+    dim = store.fields["coords"][0][0]
+    values = {"coords": coords[0:dim], "label": label, "block_side": block_side}
+    if force is not None: values["force"] = force
+    if block is not None: values["block"] = block
+    self._store = store
+    self._index = store.append(**values)
+  
+  @classmethod
+  def view(cls, store, index):
+    """
+    Returns a node viewing an existing row of a node ``ArrayStore``.
+    """
+    node = cls.__new__(cls)
+    node._store = store
+    node._index = index
+    return node
+  
+  def move_to(self, store):
+    """
+    Copies the node data to another ``ArrayStore`` and makes the node a view on it.
+    """
+    if store is self._store: return
+    self._index = store.append(**self._store.item(self._index))
+    self._store = store
   
   def data(self):
     """
@@ -315,16 +1462,14 @@ class Node(object):
     label   o        A
     dtype: object 
     """
-    return pd.Series({("label", "o") : self.label,
-                      ("coords", "x"): self.coords[0],
-                      ("coords", "y"): self.coords[1],
-                      ("disp", "ux"): self.displacement[0],
-                      ("disp", "uy"): self.displacement[1],
-                      ("force", "Fx"): self.force[0],
-                      ("force", "Fy"): self.force[1],
-                      ("block", "bx"): self.block[0] == 1,
-                      ("block", "by"): self.block[1] == 1,
-                         })
+    data = {("label", "o") : self.label}
+    for group, prefix, values in (("coords", "", self.coords), 
+                                  ("disp", "u", self.displacement), 
+                                  ("force", "F", self.force), 
+                                  ("block", "b", self.block)):
+      for axis, value in zip("xyz", values):
+        data[(group, prefix + axis)] = value
+    return pd.Series(data)
   
   def __repr__(self):
     return str(self.data())
@@ -381,6 +1526,8 @@ class Bar(object):
   :type density:  float
   :param yield_stress: yield_stress of the bar's constitutive material.
   :type yield_stress:  float
+  :param store: bar arrays the bar is appended to, a private one is created if None.
+  :type store: ``ArrayStore`` instance
   
   >>> from truss.core import Node, Bar, Model
   >>> m = Model()
@@ -391,18 +1538,41 @@ class Bar(object):
   <Bar: (0.0, 1.0) -> (1.0, 1.0), S = 1.0, E = 2.1e+11, rho = 7800.0>
 
   """
+  __slots__ = ("_store", "_index", "conn")
+  section = ArrayField("section")
+  modulus = ArrayField("modulus")
+  density = ArrayField("density")
+  yield_stress = ArrayField("yield_stress")
+  tension = ArrayField("tension")
+  elongation = ArrayField("elongation")
+  strain = ArrayField("strain")
+  stress = ArrayField("stress")
+  
   def __init__(self, n1, n2, section = 1., modulus = 1., density = 1., 
-                     yield_stress = .001):
+                     yield_stress = .001, store = None):
     
     self.conn = [n1, n2]
-    self.section = float(section)
-    self.modulus = float(modulus)
-    self.density = float(density)
-    self.yield_stress = float(yield_stress)
-    self.tension = 0.
-    self.elongation = 0.
-    self.strain = 0.
-    self.stress = 0.
+    if store is None: store = ArrayStore(BAR_FIELDS)
+    self._store = store
+    self._index = store.append(conn = (n1._index, n2._index), 
+                               section = float(section), 
+                               modulus = float(modulus), 
+                               density = float(density), 
+                               yield_stress = float(yield_stress))
+  
+  @classmethod
+  def view(cls, store, index, conn):
+    """
+    Returns a bar viewing an existing row of a bar ``ArrayStore``.
+    
+    :param conn: start and end nodes of the bar.
+    :type conn: list of ``Node`` instances
+    """
+    bar = cls.__new__(cls)
+    bar._store = store
+    bar._index = index
+    bar.conn = conn
+    return bar
   
   def data(self):
     """
@@ -424,21 +1594,22 @@ class Bar(object):
                tension             1000
     dtype: object
     """
-    return pd.Series({("conn", "c1"): self.conn[0].label,
-                      ("conn", "c2"): self.conn[1].label,
-                      ("props", "section"): self.section,
-                      ("props", "density"): self.density,
-                      ("state", "tension"): self.tension,
-                      ("state", "elongation"): self.elongation,
-                      ("state", "strain"): self.strain,
-                      ("state", "stress"): self.stress,
-                      ("state", "failure"): (self.yield_stress - abs(self.stress) <= 0.), 
-                      ("geometry", "volume"): self.volume(),
-                      ("geometry", "length"): self.length(),
-                      ("props", "mass"): self.mass(),
-                      ("direction", "dx"): self.direction()[0],
-                      ("direction", "dy"):self.direction()[1],
-                      })
+    data = {("conn", "c1"): self.conn[0].label,
+            ("conn", "c2"): self.conn[1].label,
+            ("props", "section"): self.section,
+            ("props", "density"): self.density,
+            ("state", "tension"): self.tension,
+            ("state", "elongation"): self.elongation,
+            ("state", "strain"): self.strain,
+            ("state", "stress"): self.stress,
+            ("state", "failure"): (self.yield_stress - abs(self.stress) <= 0.), 
+            ("geometry", "volume"): self.volume(),
+            ("geometry", "length"): self.length(),
+            ("props", "mass"): self.mass(),
+            }
+    for axis, value in zip("xyz", self.direction()):
+      data[("direction", "d" + axis)] = value
+    return pd.Series(data)
     
   def __repr__(self):
     return str(self.data())
@@ -529,7 +1700,8 @@ class Bar(object):
   
   def normal(self, deformed = False):
     """
-    Returns the unit vector corresponding to the normal direction of the bar.
+    Returns the unit vector corresponding to the normal direction of the bar 
+    (plane trusses only).
     
     :rtype: length 2 array
     """
@@ -543,7 +1715,7 @@ class Bar(object):
     """
     Returns stiffness matrix of the bar.
     
-    :rtype: (4,4) array
+    :rtype: (2 dim, 2 dim) array
     
     >>> from truss.core import Node, Bar, Model
     >>> m = Model()
@@ -559,9 +1731,344 @@ class Bar(object):
     """
     u = self.direction()
     k = self.stiffness()
-    ux, uy = u[0], u[1]
-    a = np.array([[-ux, -uy, ux, uy]])
+    a = np.concatenate([-u, u])[np.newaxis]
     K = k *  a.transpose().dot(a)
     return K
+
+
+class SectionProblem(object):
+  """
+  Vectorized objective and constraint evaluator for the optimization of the 
+  bar sections of a truss with ``scipy.optimize.minimize``. All functions 
+  take the sections as argument, the model is only solved when they change 
+  and every exact Jacobian comes from the same factorization.
+  
+  :param model: truss model whose sections are optimized.
+  :type model: ``Model`` instance
+  :param solver: "dense", "splu" or "auto".
+  :type solver: string
+  
+  >>> problem = SectionProblem(model)
+  >>> sol = optimize.minimize(problem.mass, model.section, 
+  ...                         jac = problem.mass_jac, method = "SLSQP", 
+  ...                         bounds = [(1.e-6, None)] * len(model.bars),
+  ...                         constraints = problem.constraints())
+  """
+  def __init__(self, model, solver = "auto"):
+    self.model = model
+    self.solver = solver
+    self._sections = None
+  
+  def update(self, sections):
+    """
+    Sets the sections of the model and solves it if they changed.
+    """
+    sections = np.array(sections, dtype = np.float64)
+    if self._sections is None or (sections != self._sections).any():
+      self.model.section = sections
+      self.model.solve(solver = self.solver)
+      self._sections = sections
+  
+  def mass(self, sections):
+    self.update(sections)
+    return self.model.mass()
+  
+  def mass_jac(self, sections):
+    self.update(sections)
+    return self.model.mass_gradient()
+  
+  def compliance(self, sections):
+    self.update(sections)
+    return self.model.compliance()
+  
+  def compliance_jac(self, sections):
+    self.update(sections)
+    return self.model.compliance_gradient()
   
-          
+  def stress_constraint(self, sections):
+    """
+    Returns the yield margins ``1 - |stress| / yield_stress`` of all bars, 
+    which must be non negative.
+    
+    :rtype: (nb,) float array
+    """
+    self.update(sections)
+    m = self.model
+    return 1. - np.abs(m.stress) / m.yield_stress
+  
+  def stress_constraint_jac(self, sections):
+    """
+    Returns the Jacobian of ``stress_constraint``.
+    
+    :rtype: (nb, nb) float array
+    """
+    self.update(sections)
+    m = self.model
+    J = m.stress_gradient(solver = self.solver)
+    return -(np.sign(m.stress) / m.yield_stress)[:, np.newaxis] * J
+  
+  def constraints(self):
+    """
+    Returns the yield constraints as expected by the SLSQP method.
+    """
+    return [{"type": "ineq", 
+             "fun": self.stress_constraint, 
+             "jac": self.stress_constraint_jac}]
+  
+  def nonlinear_constraint(self):
+    """
+    Returns the yield constraints as expected by the trust-constr method.
+    """
+    return NonlinearConstraint(self.stress_constraint, 0., np.inf, 
+                               jac = self.stress_constraint_jac)
+
+
+def load_data(path, format = None):
+  """
+  Reads a file written by ``Model.dump_data`` and returns the corresponding dataframe.
+  
+  :param path: file path.
+  :type path: string
+  :param format: "parquet", "feather" or "npz". If None, it is deduced from 
+    the file extension.
+  :type format: string
+  :rtype: ``pandas.DataFrame``
+  """
+  if format == None: format = os.path.splitext(path)[1][1:]
+  if format == "parquet":
+    data = pd.read_parquet(path)
+  elif format == "feather":
+    data = pd.read_feather(path)
+  elif format == "npz":
+    with np.load(path) as arrays:
+      data = pd.DataFrame({name: arrays[name] for name in arrays.files})
+  else:
+    raise ValueError("Unknown format: {0}".format(format))
+  data.columns = pd.MultiIndex.from_tuples(
+      [tuple(c.split(".", 1)) for c in data.columns])
+  return data
+
+
+def load_model(path, mmap_mode = "c"):
+  """
+  Loads a model saved with ``Model.save``. The arrays are memory mapped and 
+  the node and bar views are only created when accessed (see ``ViewList``) 
+  so that opening a large model does not read it. With the default copy on 
+  write mode, the model can be modified and solved without altering the files.
+  
+  :param path: directory path.
+  :type path: string
+  :param mmap_mode: memory map mode passed to ``numpy.load``, None reads 
+    the arrays in memory.
+  :type mmap_mode: string
+  :rtype: ``Model`` instance
+  """
+  with open(os.path.join(path, "model.json")) as f:
+    header = json.load(f)
+  model = Model(dim = header["dim"])
+  for kind in ("nodes", "bars"):
+    store = getattr(model, "_" + kind)
+    arrays = {}
+    for name in store.fields:
+      file_path = os.path.join(path, "{0}.{1}.npy".format(kind, name))
+      if not os.path.exists(file_path): continue
+      if name == "label":
+        labels = np.load(file_path).astype(object)
+        labels[labels == ""] = None
+        arrays[name] = labels
+      else:
+        arrays[name] = np.load(file_path, mmap_mode = mmap_mode)
+    setattr(model, "_" + kind, 
+            ArrayStore.from_arrays(store.fields, header[kind], arrays))
+  model.nodes = ViewList(model._nodes)
+  model.bars = ViewList(model._bars, model.nodes)
+  return model
+
+def model_from_tables(nodes, bars, dim = 2):
+  """
+  Creates a model from node and bar tables using the bulk ``Model.add_nodes`` 
+  and ``Model.add_bars`` path.
+  
+  :param nodes: node table with columns x, y (and z), and optionally label, 
+    Fx, Fy (Fz) and bx, by (bz).
+  :type nodes: ``pandas.DataFrame``
+  :param bars: bar table with columns n1, n2 holding node labels if the node 
+    table has labels and node indices otherwise, and optionally section, 
+    modulus, density and yield_stress.
+  :type bars: ``pandas.DataFrame``
+  :param dim: number of space dimensions.
+  :type dim: int
+  :rtype: ``Model`` instance
+  """
+  axes = list("xyz"[:dim])
+  model = Model(dim = dim)
+  columns = lambda prefix: [prefix + a for a in axes]
+  labels = nodes["label"].values if "label" in nodes else None
+  # Missing columns or cells mean no force, no blocking and default bar 
+  # properties.
+  present = lambda prefix: any(c in nodes for c in columns(prefix))
+  force, block = None, None
+  if present("F"):
+    force = nodes.reindex(columns = columns("F")).fillna(0.).values.astype(np.float64)
+  if present("b"):
+    block = nodes.reindex(columns = columns("b")).fillna(False).values.astype(bool)
+  model.add_nodes(nodes[axes].values, labels = labels, force = force, 
+                  block = block)
+  if labels is not None:
+    index = pd.Index(labels)
+    conn = np.array([index.get_indexer(bars[c]) for c in ("n1", "n2")]).T
+    missing = np.unique(bars[["n1", "n2"]].values[conn == -1])
+    if len(missing):
+      raise ValueError("Unknown node labels in bars: {0}".format(
+                       ", ".join(map(str, missing))))
+  else:
+    conn = bars[["n1", "n2"]].values
+  defaults = inspect.signature(Model.add_bars).parameters
+  props = {name: bars[name].fillna(defaults[name].default).values 
+           for name in ("section", "modulus", "density", "yield_stress") 
+           if name in bars}
+  model.add_bars(conn, **props)
+  return model
+
+def read_csv(nodes_path, bars_path, dim = 2, **kwargs):
+  """
+  Reads a model from node and bar CSV tables, see ``model_from_tables``. 
+  Keyword arguments are passed to ``pandas.read_csv``.
+  
+  :rtype: ``Model`` instance
+  """
+  return model_from_tables(pd.read_csv(nodes_path, **kwargs), 
+                           pd.read_csv(bars_path, **kwargs), dim = dim)
+
+def read_json(path):
+  """
+  Reads a model from a JSON file holding a "nodes" and a "bars" list of 
+  records, with the columns of ``model_from_tables``, and an optional "dim".
+  
+  :rtype: ``Model`` instance
+  """
+  with open(path) as f:
+    data = json.load(f)
+  return model_from_tables(pd.DataFrame(data["nodes"]), 
+                           pd.DataFrame(data["bars"]), 
+                           dim = data.get("dim", 2))
+
+
+SWEEP_PARAMETERS = ("section", "modulus", "density", "load")
+
+def solve_arrays(arrays, factorization = None):
+  """
+  Solves a model given in the compact form returned by ``Model.arrays`` and 
+  returns its global results. The ``load`` entry, if present, scales the forces.
+  
+  :param arrays: compact model.
+  :type arrays: dict
+  :param factorization: a factorization to reuse, it must match the geometry, 
+    boundary conditions, sections and moduli of ``arrays``.
+  :type factorization: ``Factorization`` instance
+  :returns: results ("mass", "max_stress", "failure", "max_displacement") and 
+    the factorization used.
+  :rtype: dict, ``Factorization`` instance
+  """
+  coords, conn = arrays["coords"], arrays["conn"]
+  section, modulus = arrays["section"], arrays["modulus"]
+  if factorization is None:
+    K = assemble_stiffness(coords, conn, modulus * section)
+    adof = np.where(arrays["block"].ravel() == False)[0]
+    solver = "dense" if len(adof) <= DENSE_SOLVER_MAX_DOF else "splu"
+    factorization = Factorization(K, adof, solver = solver)
+  f = arrays["force"].ravel() * arrays.get("load", 1.)
+  u = factorization.solve(f).reshape(coords.shape)
+  d = coords[conn[:, 1]] - coords[conn[:, 0]]
+  L2 = (d**2).sum(axis = 1)
+  stress = modulus * ((u[conn[:, 1]] - u[conn[:, 0]]) * d).sum(axis = 1) / L2
+  results = {"mass": (section * L2**.5 * arrays["density"]).sum(),
+             "max_stress": np.abs(stress).max(),
+             "failure": (np.abs(stress) >= arrays["yield_stress"]).any(),
+             "max_displacement": ((u**2).sum(axis = 1)**.5).max()}
+  return results, factorization
+
+_sweep_arrays = None
+
+def _sweep_init(arrays):
+  global _sweep_arrays
+  _sweep_arrays = arrays
+
+def _sweep_chunk(cases):
+  """
+  Evaluates a chunk of (key, case) pairs in a worker. The factorization is 
+  reused between consecutive cases with the same key, i.e. the same sections 
+  and moduli.
+  """
+  out = []
+  factorization, key = None, None
+  for case_key, case in cases:
+    arrays = dict(_sweep_arrays)
+    for name, value in case.items():
+      if name == "load":
+        arrays[name] = value
+      else:
+        arrays[name] = np.broadcast_to(value, arrays[name].shape)
+    if case_key != key: factorization = None
+    results, factorization = solve_arrays(arrays, factorization)
+    key = case_key
+    out.append(results)
+  return out
+
+def sweep(model, grid, processes = None, chunksize = 16):
+  """
+  Evaluates a truss model over the cartesian product of a parameter grid. The 
+  compact form of the model is sent once to each worker of a process pool and 
+  the cases are evaluated by chunks.
+  
+  :param model: base model.
+  :type model: ``Model`` instance
+  :param grid: parameter names ("section", "modulus", "density" or "load") 
+    mapped to lists of values. Values of "section", "modulus" and "density" 
+    are either scalars or arrays with one value per bar, "load" values scale 
+    the nodal forces of the base model.
+  :type grid: dict
+  :param processes: number of worker processes, ``os.cpu_count()`` if None. 
+    With 1, the cases are evaluated in the current process.
+  :type processes: int
+  :param chunksize: number of cases per chunk.
+  :type chunksize: int
+  :returns: "index" maps each case to the indices of its values in ``grid`` 
+    (in the order of ``grid`` keys), the other entries hold one result per 
+    case: "mass", "max_stress", "failure" and "max_displacement".
+  :rtype: dict of arrays
+  """
+  names = list(grid)
+  for name in names:
+    if name not in SWEEP_PARAMETERS:
+      raise ValueError("Unknown sweep parameter: {0}".format(name))
+  shape = [len(grid[name]) for name in names]
+  index = np.indices(shape).reshape(len(names), -1).T
+  stiffness = [j for j, name in enumerate(names) if name in ("section", "modulus")]
+  cases = [(tuple(row[stiffness]), 
+            {name: grid[name][i] for name, i in zip(names, row)}) for row in index]
+  chunks = [cases[i:i + chunksize] for i in range(0, len(cases), chunksize)]
+  arrays = model.arrays()
+  results = {"index": index,
+             "mass": np.zeros(len(cases)),
+             "max_stress": np.zeros(len(cases)),
+             "failure": np.zeros(len(cases), dtype = np.bool_),
+             "max_displacement": np.zeros(len(cases))}
+  if processes == 1:
+    _sweep_init(arrays)
+    outputs = map(_sweep_chunk, chunks)
+    executor = None
+  else:
+    executor = ProcessPoolExecutor(max_workers = processes, 
+                                   initializer = _sweep_init, 
+                                   initargs = (arrays,))
+    outputs = executor.map(_sweep_chunk, chunks)
+  try:
+    i = 0
+    for chunk in outputs:
+      for case in chunk:
+        for name, value in case.items(): results[name][i] = value
+        i += 1
+  finally:
+    if executor is not None: executor.shutdown()
+  return results
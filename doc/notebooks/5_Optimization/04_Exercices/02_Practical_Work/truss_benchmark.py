@@ -0,0 +1,232 @@
+"""
+Benchmark suite for the truss module.
+
+Times the stiffness assembly, the active dof search, the solve, the data
+export and the mass computation on synthetic trusses of growing size, records
+their peak memory and stores the results in a JSON file that can be compared
+with a previous run. Every timing sample runs an autoranged loop of calls
+lasting at least ``MIN_TIME`` and the spread of the samples is recorded, so
+that the comparison can tell regressions from noise:
+
+  python truss_benchmark.py --output new.json --compare baseline.json
+"""
+import argparse
+import copy
+import json
+import pickle
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+import numpy as np
+import scipy
+import truss
+
+SIZES = (10, 100, 1000, 10000, 100000)
+
+# Minimum duration of a timing sample [s].
+MIN_TIME = .1
+# Differences below these floors are never reported as regressions.
+TIME_FLOOR = 5.e-5
+MEMORY_FLOOR = 65536
+
+PROPS = {"section": 1.e-2, "modulus": 210.e9, "density": 7800.,
+         "yield_stress": 400.e6}
+
+def warren(bars, length = 1., height = 1., load = -1.e3):
+  """
+  Returns a simply supported Warren girder with about ``bars`` bars.
+  """
+  n = max(2, (bars + 1) // 4)
+  m = truss.Model()
+  bottom = [m.add_node((i * length, 0.)) for i in range(n + 1)]
+  top = [m.add_node(((i + .5) * length, height)) for i in range(n)]
+  for i in range(n):
+    m.add_bar(bottom[i], bottom[i + 1], **PROPS)
+    m.add_bar(bottom[i], top[i], **PROPS)
+    m.add_bar(top[i], bottom[i + 1], **PROPS)
+    if i < n - 1: m.add_bar(top[i], top[i + 1], **PROPS)
+  for node in bottom[1:-1]: node.force[1] = load
+  bottom[0].block[:] = True
+  bottom[-1].block[1] = True
+  return m
+
+def pratt(bars, length = 1., height = 1., load = -1.e3):
+  """
+  Returns a simply supported Pratt girder with about ``bars`` bars.
+  """
+  n = max(2, (bars - 1) // 4)
+  m = truss.Model()
+  bottom = [m.add_node((i * length, 0.)) for i in range(n + 1)]
+  top = [m.add_node((i * length, height)) for i in range(n + 1)]
+  for i in range(n + 1):
+    m.add_bar(bottom[i], top[i], **PROPS)
+  for i in range(n):
+    m.add_bar(bottom[i], bottom[i + 1], **PROPS)
+    m.add_bar(top[i], top[i + 1], **PROPS)
+    if i < n // 2:
+      m.add_bar(top[i], bottom[i + 1], **PROPS)
+    else:
+      m.add_bar(bottom[i], top[i + 1], **PROPS)
+  for node in bottom[1:-1]: node.force[1] = load
+  bottom[0].block[:] = True
+  bottom[-1].block[1] = True
+  return m
+
+def lattice(bars, length = 1., load = -1.e3):
+  """
+  Returns a square lattice with one diagonal per cell and about ``bars``
+  bars, clamped at its bottom and loaded at its top.
+  """
+  k = max(2, int(round((bars / 3.)**.5)) + 1)
+  m = truss.Model()
+  nodes = [[m.add_node((i * length, j * length)) for i in range(k)]
+           for j in range(k)]
+  for j in range(k):
+    for i in range(k):
+      if i < k - 1: m.add_bar(nodes[j][i], nodes[j][i + 1], **PROPS)
+      if j < k - 1: m.add_bar(nodes[j][i], nodes[j + 1][i], **PROPS)
+      if i < k - 1 and j < k - 1:
+        m.add_bar(nodes[j][i], nodes[j + 1][i + 1], **PROPS)
+  for node in nodes[0]: node.block[:] = True
+  for node in nodes[-1]: node.force[1] = load
+  return m
+
+def lattice3d(bars, length = 1., load = -1.e3):
+  """
+  Returns a cubic space lattice with about ``bars`` bars, each cube being 
+  split into tetrahedra, clamped at its bottom and loaded at its top.
+  """
+  k = max(2, int(round((bars / 7.)**(1. / 3.))) + 1)
+  m = truss.Model(dim = 3)
+  nodes = {}
+  for p in np.ndindex(k, k, k):
+    nodes[p] = m.add_node(np.array(p[::-1]) * length)
+  offsets = [o for o in np.ndindex(2, 2, 2) if any(o)]
+  for p in np.ndindex(k, k, k):
+    for o in offsets:
+      q = tuple(np.add(p, o))
+      if q in nodes: m.add_bar(nodes[p], nodes[q], **PROPS)
+  for (z, y, x), node in nodes.items():
+    if z == 0: node.block[:] = True
+    if z == k - 1: node.force[2] = load
+  return m
+
+GENERATORS = {"warren": warren, "pratt": pratt, "lattice": lattice, 
+              "lattice3d": lattice3d}
+
+OPERATIONS = {
+  "stiffness_matrix": lambda m: m.stiffness_matrix(sparse = True),
+  "active_dof": lambda m: m.active_dof(),
+  # The factorization cache is cleared so that every timed call factorizes.
+  "solve": lambda m: (setattr(m, "_factorization_key", None), m.solve()),
+  "solve_cached": lambda m: m.solve(),
+  # Runs on a solved model: checks that the cached factorization does not
+  # prevent copies.
+  "copy": lambda m: pickle.loads(pickle.dumps(copy.deepcopy(m))),
+  "data": lambda m: (m.data(at = "nodes"), m.data(at = "bars")),
+  "mass": lambda m: m.mass(),
+  }
+
+def measure(func, model, repeat = 5, min_time = MIN_TIME):
+  """
+  Times ``repeat`` samples of an autoranged loop of calls, each sample lasting
+  at least ``min_time``. Returns the best time per call, the standard
+  deviation of the per call times of the samples, the number of calls per
+  sample and the peak memory of one call.
+  """
+  timer = timeit.Timer(lambda: func(model))
+  number = 1
+  while True:
+    t = timer.timeit(number)
+    if t >= min_time: break
+    number = max(2 * number, int(1.2 * number * min_time / max(t, 1.e-9)))
+  times = np.array([t] + timer.repeat(repeat - 1, number)) / number
+  tracemalloc.start()
+  func(model)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return times.min(), times.std(), number, peak
+
+def run(generators = GENERATORS, sizes = SIZES, repeat = 5,
+        min_time = MIN_TIME, verbose = True):
+  """
+  Runs the benchmark and returns the results as a JSON serializable dict.
+  """
+  results = []
+  for name in generators:
+    for size in sizes:
+      model = GENERATORS[name](size)
+      for operation, func in OPERATIONS.items():
+        t, spread, number, peak = measure(func, model, repeat = repeat,
+                                          min_time = min_time)
+        results.append({"generator": name, "size": size,
+                        "nodes": len(model.nodes), "bars": len(model.bars),
+                        "operation": operation, "time": t, "spread": spread,
+                        "number": number, "peak_memory": peak})
+        if verbose:
+          print("{generator:>8} {bars:>7} bars {operation:>16}: "
+                "{time:.3e} s +/- {spread:.1e} ({number:>6} calls), "
+                "{peak_memory:>11} B".format(**results[-1]))
+  meta = {"python": platform.python_version(), "numpy": np.__version__,
+          "scipy": scipy.__version__, "machine": platform.machine(),
+          "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+  return {"meta": meta, "results": results}
+
+def compare(new, baseline, tolerance = .2, time_floor = TIME_FLOOR,
+            memory_floor = MEMORY_FLOOR, spreads = 3.):
+  """
+  Prints the time and memory ratios between two runs and returns the list of
+  the entries that regressed: their time grew by more than ``tolerance``, by
+  more than ``time_floor`` and by more than ``spreads`` times the combined
+  spread of both runs, or their memory grew by more than ``tolerance`` and
+  ``memory_floor``.
+  """
+  key = lambda r: (r["generator"], r["size"], r["operation"])
+  old = {key(r): r for r in baseline["results"]}
+  regressions = []
+  for r in new["results"]:
+    if key(r) not in old: continue
+    o = old[key(r)]
+    time_ratio = r["time"] / o["time"]
+    memory_ratio = (r["peak_memory"] + 1.) / (o["peak_memory"] + 1.)
+    dt = r["time"] - o["time"]
+    noise = spreads * (r.get("spread", 0.)**2 + o.get("spread", 0.)**2)**.5
+    slower = (time_ratio > 1. + tolerance and dt > time_floor and dt > noise)
+    bigger = (memory_ratio > 1. + tolerance and
+              r["peak_memory"] - o["peak_memory"] > memory_floor)
+    flag = ""
+    if slower or bigger:
+      flag = "REGRESSION"
+      regressions.append(r)
+    print("{0:>8} {1:>7} bars {2:>16}: time x{3:.2f}, memory x{4:.2f} {5}".format(
+          r["generator"], r["bars"], r["operation"], time_ratio, memory_ratio,
+          flag))
+  return regressions
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+  parser.add_argument("--output", default = "truss_benchmark.json",
+                      help = "file where the results are written")
+  parser.add_argument("--compare", default = None,
+                      help = "baseline results to compare with")
+  parser.add_argument("--sizes", type = int, nargs = "+", default = SIZES,
+                      help = "approximate numbers of bars")
+  parser.add_argument("--generators", nargs = "+", default = list(GENERATORS),
+                      choices = list(GENERATORS))
+  parser.add_argument("--repeat", type = int, default = 5,
+                      help = "number of timing samples")
+  parser.add_argument("--min-time", type = float, default = MIN_TIME,
+                      help = "minimum duration of a timing sample [s]")
+  parser.add_argument("--tolerance", type = float, default = .2,
+                      help = "relative slowdown reported as a regression")
+  args = parser.parse_args()
+  results = run(args.generators, args.sizes, repeat = args.repeat,
+                min_time = args.min_time)
+  with open(args.output, "w") as f:
+    json.dump(results, f, indent = 1)
+  if args.compare != None:
+    with open(args.compare) as f:
+      baseline = json.load(f)
+    if compare(results, baseline, args.tolerance): sys.exit(1)